@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# benchmarks/arranque.py
+"""
+Benchmark de arranque en frío (python -X importtime)
+
+Mide, en procesos nuevos, el tiempo de importar el servidor HTTP, de
+preparar el esquema y de importar el punto de entrada de escritorio que
+usa run.py. Reporta el tiempo total, los módulos más costosos y qué
+dependencias pesadas (pandas, PIL, qrcode, PySide6) se cargaron.
+
+Uso:
+    python benchmarks/arranque.py
+    python benchmarks/arranque.py --repeticiones 10 --salida arranque.json
+    python benchmarks/arranque.py --comparar arranque_base.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+
+OBJETIVOS = {
+    'servidor': "import core.server.app",
+    'servidor_esquema': (
+        "import core.server.app\n"
+        "from config.database import engine\n"
+        "from core.models.models import preparar_esquema\n"
+        "preparar_esquema(engine)"
+    ),
+    'escritorio': "import desktop.main",
+}
+
+PESADOS = ['pandas', 'openpyxl', 'PIL', 'qrcode', 'PySide6', 'uvicorn']
+
+
+def medir(codigo):
+    """Ejecuta `codigo` en un intérprete nuevo; retorna (segundos, {módulo: µs acumulados}) o None si falla"""
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=project_root, capture_output=True, text=True
+    )
+    duracion = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        return None, proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "error"
+
+    modulos = {}
+    for linea in proceso.stderr.splitlines():
+        # import time:       self [us] |   cumulative | imported package
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos[nombre.strip()] = int(acumulado)
+    return duracion, modulos
+
+
+def medir_objetivo(codigo, repeticiones, top):
+    mejores = None
+    tiempos = []
+    for _ in range(repeticiones):
+        duracion, modulos = medir(codigo)
+        if duracion is None:
+            return {'error': modulos}
+        tiempos.append(duracion)
+        if mejores is None or duracion <= min(tiempos):
+            mejores = modulos
+
+    raices = {nombre.split('.')[0] for nombre in mejores}
+    return {
+        'min_ms': round(min(tiempos) * 1000, 1),
+        'mediana_ms': round(sorted(tiempos)[len(tiempos) // 2] * 1000, 1),
+        'modulos': len(mejores),
+        'pesados': [m for m in PESADOS if m in raices],
+        'top': [
+            {'modulo': nombre.strip(), 'acumulado_ms': round(us / 1000, 1)}
+            for nombre, us in sorted(mejores.items(), key=lambda x: -x[1])[:top]
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío de BomApettite")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="Módulos más costosos a listar")
+    parser.add_argument('--objetivo', choices=list(OBJETIVOS), action='append',
+                        help="Medir solo estos objetivos (por defecto todos)")
+    parser.add_argument('--salida', type=Path, help="Archivo JSON de resultados (por defecto stdout)")
+    parser.add_argument('--comparar', type=Path, help="Resultado previo contra el que detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.20, help="Regresión máxima aceptada (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeticiones': args.repeticiones,
+        'objetivos': {
+            nombre: medir_objetivo(OBJETIVOS[nombre], args.repeticiones, args.top)
+            for nombre in (args.objetivo or OBJETIVOS)
+        }
+    }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        args.salida.write_text(texto, encoding='utf-8')
+    else:
+        print(texto)
+
+    if args.comparar:
+        base = json.loads(args.comparar.read_text(encoding='utf-8'))
+        regresiones = []
+        for nombre, datos in resultado['objetivos'].items():
+            previo = base.get('objetivos', {}).get(nombre, {})
+            if 'min_ms' not in previo or 'min_ms' not in datos:
+                continue
+            cambio = (datos['min_ms'] - previo['min_ms']) / previo['min_ms']
+            if cambio > args.tolerancia:
+                regresiones.append(f"{nombre}: {previo['min_ms']}ms -> {datos['min_ms']}ms (+{cambio:.0%})")
+            nuevos = set(datos['pesados']) - set(previo.get('pesados', []))
+            if nuevos:
+                regresiones.append(f"{nombre}: ahora importa {', '.join(sorted(nuevos))}")
+        for r in regresiones:
+            print(f"⚠️  Regresión: {r}", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
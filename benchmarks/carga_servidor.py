@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# benchmarks/carga_servidor.py
+"""
+Benchmark de carga reproducible del servidor de pedidos
+
+Siembra una base SQLite temporal con mesas, productos e histórico de pedidos,
+ejecuta una mezcla realista de peticiones (carga de la carta, sondeo del menú,
+ráfagas de pedidos y cambios de estado) y emite throughput, latencias
+p50/p95/p99 y tiempos de escritura/commit en SQLite como JSON.
+
+Uso:
+    python benchmarks/carga_servidor.py --usuarios 20 --peticiones 200
+    python benchmarks/carga_servidor.py --modo uvicorn --salida actual.json
+    python benchmarks/carga_servidor.py --comparar base.json
+
+Requiere httpx (no forma parte de requirements.txt).
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("Este benchmark requiere httpx: pip install httpx")
+
+import uvicorn
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from core.models.models import Mesa, Producto, Pedido, DetallePedido, SesionMesa, preparar_esquema
+
+CATEGORIAS = ['Entrantes', 'Principales', 'Postres', 'Bebidas', 'Café']
+
+# Peso relativo de cada escenario dentro de la mezcla
+MEZCLA = {
+    'pagina': 10,      # GET /?mesa=N
+    'menu': 50,        # GET /api/menu (sondeo)
+    'pedido': 25,      # ráfaga de POST /api/pedido/{mesa}
+    'estado': 15,      # GET pendientes + POST estado
+}
+
+
+# ===== MÉTRICAS =====
+def percentiles(valores):
+    """p50/p95/p99 por rango más cercano, en milisegundos"""
+    if not valores:
+        return {'n': 0, 'p50': None, 'p95': None, 'p99': None}
+    orden = sorted(valores)
+    n = len(orden)
+
+    def p(q):
+        return round(orden[min(n - 1, max(0, int(round(q * n)) - 1))] * 1000, 3)
+
+    return {'n': n, 'p50': p(0.50), 'p95': p(0.95), 'p99': p(0.99)}
+
+
+class MetricasBD:
+    """
+    Tiempos de escritura y commit medidos sobre el engine del benchmark.
+
+    SQLite no expone el tiempo de espera por el lock de escritura; queda
+    incluido en estas latencias (busy timeout del driver).
+    """
+
+    def __init__(self, engine, session_factory):
+        self.escrituras = []
+        self.commits = []
+        self.errores_bloqueo = 0
+        self._lock = threading.Lock()
+
+        event.listen(engine, "before_cursor_execute", self._antes)
+        event.listen(engine, "after_cursor_execute", self._despues)
+        event.listen(engine, "handle_error", self._error)
+        event.listen(session_factory, "before_commit", self._antes_commit)
+        event.listen(session_factory, "after_commit", self._despues_commit)
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['bench_inicio'] = time.perf_counter()
+
+    def _despues(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            duracion = time.perf_counter() - conn.info.pop('bench_inicio')
+            with self._lock:
+                self.escrituras.append(duracion)
+
+    def _error(self, contexto):
+        if 'locked' in str(contexto.original_exception):
+            with self._lock:
+                self.errores_bloqueo += 1
+
+    def _antes_commit(self, session):
+        session.info['bench_commit'] = time.perf_counter()
+
+    def _despues_commit(self, session):
+        inicio = session.info.pop('bench_commit', None)
+        if inicio is not None:
+            with self._lock:
+                self.commits.append(time.perf_counter() - inicio)
+
+    def reiniciar(self):
+        with self._lock:
+            self.escrituras.clear()
+            self.commits.clear()
+            self.errores_bloqueo = 0
+
+    def resultado(self):
+        with self._lock:
+            return {
+                'escrituras': {**percentiles(self.escrituras), 'total_ms': round(sum(self.escrituras) * 1000, 3)},
+                'commits': {**percentiles(self.commits), 'total_ms': round(sum(self.commits) * 1000, 3)},
+                'errores_bloqueo': self.errores_bloqueo
+            }
+
+
+# ===== DATOS =====
+def sembrar(session_factory, rnd, n_mesas, n_productos, n_pedidos):
+    """
+    Crea mesas, productos y un histórico de pedidos de los últimos 90 días.
+
+    Los pedidos se insertan en orden cronológico para que los triggers los
+    agrupen en cuentas como en el uso real (una cuenta nueva tras horas sin
+    movimiento en la mesa); al final se cierran las que quedaron inactivas.
+    """
+    db = session_factory()
+    try:
+        db.bulk_insert_mappings(Mesa, [
+            {'id': i, 'numero': i, 'nombre': f'Mesa {i}', 'activa': True}
+            for i in range(1, n_mesas + 1)
+        ])
+        db.bulk_insert_mappings(Producto, [
+            {
+                'id': i,
+                'nombre': f'Producto {i}',
+                'descripcion': f'Descripción del producto {i} con ingredientes de la casa',
+                'precio': round(rnd.uniform(1, 40), 2),
+                'categoria': rnd.choice(CATEGORIAS),
+                'disponible': rnd.random() > 0.05
+            }
+            for i in range(1, n_productos + 1)
+        ])
+
+        ahora = datetime.now()
+        fechas = sorted(ahora - timedelta(minutes=rnd.randint(60, 90 * 24 * 60)) for _ in range(n_pedidos))
+        pedidos = []
+        detalles = []
+        for pid, fecha in enumerate(fechas, start=1):
+            total = 0
+            for _ in range(rnd.randint(1, 5)):
+                precio = round(rnd.uniform(1, 40), 2)
+                cantidad = rnd.randint(1, 3)
+                detalles.append({
+                    'pedido_id': pid,
+                    'producto_id': rnd.randint(1, n_productos),
+                    'cantidad': cantidad,
+                    'precio_unitario': precio
+                })
+                total += precio * cantidad
+            pedidos.append({
+                'id': pid,
+                'mesa_id': rnd.randint(1, n_mesas),
+                'fecha_hora': fecha,
+                'estado': rnd.choices(['entregado', 'cancelado'], weights=[95, 5])[0],
+                'total': round(total, 2)
+            })
+        db.bulk_insert_mappings(Pedido, pedidos)
+        db.bulk_insert_mappings(DetallePedido, detalles)
+        SesionMesa.cerrar_inactivas(db)
+        db.commit()
+
+        return [p[0] for p in db.query(Producto.id).filter(Producto.disponible == True).all()]
+    finally:
+        db.close()
+
+
+# ===== CARGA =====
+class Usuario:
+    """Cliente virtual que ejecuta `peticiones` escenarios de la mezcla"""
+
+    def __init__(self, cliente, rnd, n_mesas, productos, latencias, errores):
+        self.cliente = cliente
+        self.rnd = rnd
+        self.n_mesas = n_mesas
+        self.productos = productos
+        self.latencias = latencias
+        self.errores = errores
+
+    async def _peticion(self, escenario, metodo, url, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.cliente.request(metodo, url, **kwargs)
+            ok = respuesta.status_code < 400
+        except httpx.HTTPError:
+            respuesta, ok = None, False
+        self.latencias.setdefault(escenario, []).append(time.perf_counter() - inicio)
+        if not ok:
+            self.errores[escenario] = self.errores.get(escenario, 0) + 1
+        return respuesta if ok else None
+
+    async def ejecutar(self, peticiones):
+        escenarios = list(MEZCLA)
+        pesos = list(MEZCLA.values())
+        for _ in range(peticiones):
+            escenario = self.rnd.choices(escenarios, weights=pesos)[0]
+            mesa = self.rnd.randint(1, self.n_mesas)
+
+            if escenario == 'pagina':
+                await self._peticion('pagina', 'GET', f'/?mesa={mesa}')
+
+            elif escenario == 'menu':
+                await self._peticion('menu', 'GET', '/api/menu')
+
+            elif escenario == 'pedido':
+                for _ in range(self.rnd.randint(1, 4)):
+                    items = [
+                        {'producto_id': self.rnd.choice(self.productos), 'cantidad': self.rnd.randint(1, 3)}
+                        for _ in range(self.rnd.randint(1, 6))
+                    ]
+                    await self._peticion('pedido', 'POST', f'/api/pedido/{mesa}', json={'items': items})
+
+            else:
+                respuesta = await self._peticion('pendientes', 'GET', '/api/pedidos/pendientes')
+                pendientes = respuesta.json() if respuesta is not None else []
+                if pendientes:
+                    pedido = self.rnd.choice(pendientes)
+                    await self._peticion(
+                        'estado', 'POST', f"/api/pedido/{pedido['id']}/estado",
+                        params={'estado': self.rnd.choice(['preparando', 'listo', 'entregado'])}
+                    )
+
+
+async def ejecutar_carga(base_url, transport, args, productos):
+    latencias = {}
+    errores = {}
+    limites = httpx.Limits(max_connections=args.usuarios)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limites, timeout=30) as cliente:
+        usuarios = [
+            Usuario(cliente, random.Random(args.semilla + i + 1), args.mesas, productos, latencias, errores)
+            for i in range(args.usuarios)
+        ]
+        # Calentamiento: una carga de carta y menú por usuario
+        await asyncio.gather(*(u._peticion('calentamiento', 'GET', '/api/menu') for u in usuarios))
+        latencias.pop('calentamiento', None)
+        errores.pop('calentamiento', None)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(u.ejecutar(args.peticiones) for u in usuarios))
+        duracion = time.perf_counter() - inicio
+
+    return latencias, errores, duracion
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _servidor_temporal(ruta):
+    """
+    Importa core.server.app con config.database apuntando a una base temporal.
+
+    Así get_db, el lifespan (preparar_esquema) y el listener que activa WAL y
+    busy_timeout actúan sobre la base del benchmark y nunca sobre la
+    configurada.
+    """
+    if 'core.server.app' in sys.modules:
+        raise RuntimeError("core.server.app ya se importó con la base configurada")
+
+    import config.database as database
+    database.engine = create_engine(f"sqlite:///{ruta}", connect_args={'check_same_thread': False})
+    database.SessionLocal = sessionmaker(bind=database.engine)
+
+    from core.server import app as servidor
+    return servidor
+
+
+def _iniciar_uvicorn(app):
+    """Levanta la app en un uvicorn local dentro de un hilo"""
+    puerto = _puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=puerto, log_level='warning'))
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, hilo, f'http://127.0.0.1:{puerto}'
+
+
+# ===== COMPARACIÓN =====
+def comparar(base, actual, tolerancia):
+    """Regresiones de p95 y throughput respecto a un resultado anterior"""
+    regresiones = []
+    for escenario, datos in actual['escenarios'].items():
+        previo = base.get('escenarios', {}).get(escenario)
+        if not previo or not previo.get('p95') or not datos.get('p95'):
+            continue
+        cambio = (datos['p95'] - previo['p95']) / previo['p95']
+        if cambio > tolerancia:
+            regresiones.append(f"{escenario}: p95 {previo['p95']}ms -> {datos['p95']}ms (+{cambio:.0%})")
+
+    previo_rps = base.get('global', {}).get('rps')
+    if previo_rps:
+        cambio = (previo_rps - actual['global']['rps']) / previo_rps
+        if cambio > tolerancia:
+            regresiones.append(f"throughput: {previo_rps} -> {actual['global']['rps']} req/s (-{cambio:.0%})")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del servidor BomApettite")
+    parser.add_argument('--mesas', type=int, default=20)
+    parser.add_argument('--productos', type=int, default=80)
+    parser.add_argument('--pedidos', type=int, default=5000, help="Pedidos históricos sembrados")
+    parser.add_argument('--usuarios', type=int, default=10, help="Clientes concurrentes")
+    parser.add_argument('--peticiones', type=int, default=100, help="Escenarios por cliente")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--modo', choices=['proceso', 'uvicorn'], default='proceso')
+    parser.add_argument('--salida', type=Path, help="Archivo JSON de resultados (por defecto stdout)")
+    parser.add_argument('--comparar', type=Path, help="Resultado previo contra el que detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.15, help="Regresión máxima aceptada (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.semilla)
+
+    with tempfile.TemporaryDirectory(prefix='bomapettite_bench_') as tmp:
+        app_servidor = _servidor_temporal(Path(tmp) / 'bench.db')
+        engine = app_servidor.engine
+        preparar_esquema(engine)
+
+        productos = sembrar(app_servidor.SessionLocal, rnd, args.mesas, args.productos, args.pedidos)
+        metricas = MetricasBD(engine, app_servidor.SessionLocal)
+
+        servidor = None
+        try:
+            if args.modo == 'uvicorn':
+                servidor, hilo, base_url = _iniciar_uvicorn(app_servidor.app)
+                transport = None
+            else:
+                base_url = 'http://bench'
+                transport = httpx.ASGITransport(app=app_servidor.app)
+
+            metricas.reiniciar()
+            latencias, errores, duracion = asyncio.run(ejecutar_carga(base_url, transport, args, productos))
+        finally:
+            if servidor is not None:
+                servidor.should_exit = True
+                hilo.join()
+            engine.dispose()
+
+    total = sum(len(v) for v in latencias.values())
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parametros': {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        'global': {
+            'peticiones': total,
+            'duracion_s': round(duracion, 3),
+            'rps': round(total / duracion, 2) if duracion else None,
+            'errores': sum(errores.values()),
+            **percentiles([x for v in latencias.values() for x in v])
+        },
+        'escenarios': {
+            escenario: {
+                **percentiles(valores),
+                'rps': round(len(valores) / duracion, 2) if duracion else None,
+                'errores': errores.get(escenario, 0)
+            }
+            for escenario, valores in sorted(latencias.items())
+        },
+        'bd': metricas.resultado()
+    }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        args.salida.write_text(texto, encoding='utf-8')
+    else:
+        print(texto)
+
+    if args.comparar:
+        base = json.loads(args.comparar.read_text(encoding='utf-8'))
+        regresiones = comparar(base, resultado, args.tolerancia)
+        for r in regresiones:
+            print(f"⚠️  Regresión: {r}", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# benchmarks/formato.py
+"""
+Benchmark del formato de respuesta de /api/menu y /api/pedidos/pendientes
+
+Compara el JSON actual con el formato compacto (columnas + diccionarios) y
+con MessagePack: tamaño del cuerpo (crudo y con gzip) y tiempo del servidor
+para construir la estructura y serializarla, sobre una base temporal.
+
+Uso:
+    python benchmarks/formato.py
+    python benchmarks/formato.py --productos 300 --pendientes 100 --salida formato.json
+
+Requiere httpx (por la siembra compartida con carga_servidor.py); msgpack es
+opcional y se omite si no está instalado.
+"""
+
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker, selectinload
+
+from carga_servidor import sembrar
+from core.models.models import Pedido, DetallePedido, preparar_esquema
+from core.server import app as servidor
+from core.server.formato import codificar
+
+
+def serializar_json(datos):
+    """Lo mismo que hace FastAPI con el dict que retorna un endpoint"""
+    return JSONResponse(content=jsonable_encoder(datos)).body
+
+
+def cronometrar(funcion, repeticiones):
+    """(resultado, mediana en ms)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, round(sorted(tiempos)[len(tiempos) // 2] * 1000, 3)
+
+
+def medir(construir_json, construir_compacto, formatos, repeticiones):
+    resultado = {}
+    for formato in formatos:
+        construir = construir_json if formato == 'json' else construir_compacto
+        datos, construccion = cronometrar(construir, repeticiones)
+        if formato == 'json':
+            cuerpo, serializacion = cronometrar(lambda: serializar_json(datos), repeticiones)
+        else:
+            (cuerpo, _), serializacion = cronometrar(lambda: codificar(datos, formato), repeticiones)
+        resultado[formato] = {
+            'bytes': len(cuerpo),
+            'gzip_bytes': len(gzip.compress(cuerpo)),
+            'construccion_ms': construccion,
+            'serializacion_ms': serializacion,
+        }
+
+    base = resultado['json']
+    for datos in resultado.values():
+        datos['relativo'] = round(datos['bytes'] / base['bytes'], 3)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de formatos de respuesta de BomApettite")
+    parser.add_argument('--mesas', type=int, default=20)
+    parser.add_argument('--productos', type=int, default=120)
+    parser.add_argument('--pedidos', type=int, default=2000, help="Pedidos históricos sembrados")
+    parser.add_argument('--pendientes', type=int, default=60, help="Pedidos que quedan en estado pendiente")
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', type=Path, help="Archivo JSON de resultados (por defecto stdout)")
+    args = parser.parse_args()
+
+    formatos = ['json', 'compacto']
+    try:
+        import msgpack  # noqa: F401
+        formatos.append('msgpack')
+    except ImportError:
+        print("msgpack no instalado: se omite", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix='bomapettite_formato_') as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        preparar_esquema(engine)
+        BenchSession = sessionmaker(bind=engine)
+        sembrar(BenchSession, random.Random(args.semilla), args.mesas, args.productos, args.pedidos)
+
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE productos SET imagen_path = 'producto_' || id || '.jpg' WHERE id % 4 != 0"))
+            conn.execute(text(
+                "UPDATE pedidos SET estado = 'pendiente', notas = 'Sin cebolla' "
+                "WHERE id > (SELECT MAX(id) FROM pedidos) - :n"
+            ), {"n": args.pendientes})
+
+        db = BenchSession()
+        try:
+            version = 0
+
+            def pendientes():
+                return db.query(Pedido).options(
+                    selectinload(Pedido.mesa),
+                    selectinload(Pedido.detalles).selectinload(DetallePedido.producto)
+                ).filter(Pedido.estado == 'pendiente').order_by(Pedido.fecha_hora.desc()).all()
+
+            def pendientes_json():
+                return [{
+                    "id": p.id,
+                    "mesa_id": p.mesa_id,
+                    "mesa_nombre": p.mesa.nombre,
+                    "total": p.total,
+                    "hora": p.fecha_hora.strftime("%H:%M"),
+                    "notas": p.notas,
+                    "items": [{"nombre": d.producto.nombre, "cantidad": d.cantidad} for d in p.detalles]
+                } for p in pendientes()]
+
+            resultado = {
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'parametros': {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+                'menu': medir(
+                    lambda: servidor._construir_menu(db, None, None, version),
+                    lambda: servidor._construir_menu_compacto(db, None, None, version),
+                    formatos, args.repeticiones
+                ),
+                'pedidos_pendientes': medir(
+                    pendientes_json,
+                    lambda: servidor._pedidos_compactos(pendientes()),
+                    formatos, args.repeticiones
+                ),
+            }
+        finally:
+            db.close()
+            engine.dispose()
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        args.salida.write_text(texto, encoding='utf-8')
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# core/archivado.py
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker, selectinload, joinedload
+
+from core.models.models import Base, Mesa, Producto, Pedido, DetallePedido, Cambio, SesionMesa
+
+
+class Archivador:
+    """
+    Mueve los pedidos cerrados antiguos a bases SQLite de archivo, una por año
+    (database/archivo/pedidos_2025.db), para mantener pequeña la base en uso.
+
+    Cada archivo lleva copia de las mesas y productos que referencian sus
+    pedidos, así los reportes históricos no dependen de la base viva.
+    """
+
+    ESTADOS_CERRADOS = ['entregado', 'cancelado']
+    DIAS_DEFAULT = 180
+
+    TABLAS = [Mesa.__table__, Producto.__table__, Pedido.__table__, DetallePedido.__table__]
+
+    def __init__(self, archivo_dir=None, engine=None):
+        if archivo_dir is None:
+            from config.settings import Settings
+            archivo_dir = Settings.BASE_DIR / "database" / "archivo"
+        if engine is None:
+            from config.database import engine
+        self.archivo_dir = Path(archivo_dir)
+        self.engine = engine
+
+    def ruta_archivo(self, anio):
+        return self.archivo_dir / f"pedidos_{anio}.db"
+
+    # ===== ARCHIVADO =====
+    def archivar(self, dias=DIAS_DEFAULT, vacuum=True):
+        """
+        Archiva los pedidos entregados o cancelados con más de `dias` de antigüedad.
+
+        Retorna {año: pedidos archivados}.
+        """
+        limite = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.engine.begin() as conn:
+            SesionMesa.cerrar_inactivas(conn)
+        # Los pedidos de una cuenta aún abierta se quedan: borrarlos la descontaría
+        filtro = (
+            f"estado IN ({', '.join(repr(e) for e in self.ESTADOS_CERRADOS)}) AND fecha_hora < :limite"
+            " AND id NOT IN ("
+            "SELECT ps.pedido_id FROM main.pedidos_sesion AS ps"
+            " JOIN main.sesiones_mesa AS s ON s.id = ps.sesion_id WHERE s.cerrada_en IS NULL)"
+        )
+
+        with self.engine.connect() as conn:
+            anios = [fila[0] for fila in conn.execute(
+                text(f"SELECT DISTINCT strftime('%Y', fecha_hora) FROM pedidos WHERE {filtro}"),
+                {"limite": limite}
+            )]
+
+        if anios:
+            self._reservar_ids()
+
+        archivados = {}
+        for anio in anios:
+            archivados[int(anio)] = self._archivar_anio(anio, f"{filtro} AND strftime('%Y', fecha_hora) = :anio", limite)
+
+        with self.engine.begin() as conn:
+            Cambio.purgar(conn)
+
+        if vacuum and archivados:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM")
+
+        return archivados
+
+    def _archivar_anio(self, anio, filtro, limite):
+        ruta = self.ruta_archivo(anio)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        parametros = {"limite": limite, "anio": anio}
+        ids_pedidos = "SELECT id FROM temp.archivar_ids"
+        ids_verificados = "SELECT id FROM temp.archivar_ids WHERE verificado"
+        ids_cambiados = "SELECT id FROM temp.archivar_ids WHERE NOT verificado"
+
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS archivo", (str(ruta),))
+            conn.commit()
+            try:
+                Base.metadata.create_all(
+                    conn.execution_options(schema_translate_map={None: "archivo"}),
+                    tables=self.TABLAS
+                )
+
+                # Fase 1: copiar y confirmar en el archivo. Con WAL un commit no
+                # es atómico entre bases adjuntas, así que aún no se borra nada
+                conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS archivar_ids (id INTEGER PRIMARY KEY, verificado INTEGER DEFAULT 0)")
+                conn.exec_driver_sql("DELETE FROM temp.archivar_ids")
+                conn.execute(text(f"INSERT INTO temp.archivar_ids (id) SELECT id FROM main.pedidos WHERE {filtro}"), parametros)
+                seleccionados = conn.exec_driver_sql("SELECT COUNT(*) FROM temp.archivar_ids").scalar()
+
+                # Mesas y productos son referencias: se guarda su último estado
+                self._copiar(conn, "mesas", f"id IN (SELECT mesa_id FROM main.pedidos WHERE id IN ({ids_pedidos}))", reemplazar=True)
+                self._copiar(conn, "productos", f"id IN (SELECT producto_id FROM main.detalles_pedido WHERE pedido_id IN ({ids_pedidos}))", reemplazar=True)
+                self._copiar(conn, "pedidos", f"id IN ({ids_pedidos})")
+                self._copiar(conn, "detalles_pedido", f"pedido_id IN ({ids_pedidos})")
+                conn.commit()
+
+                # Fase 2: borrar de la base viva solo los pedidos cuya copia
+                # (pedido y todos sus detalles) está idéntica en el archivo.
+                # El primer DELETE toma el bloqueo de escritura, así nadie
+                # modifica los pedidos entre la verificación y el borrado
+                verificados = f"""
+                    SELECT t.id FROM temp.archivar_ids AS t JOIN main.pedidos AS m ON m.id = t.id
+                    WHERE EXISTS (SELECT 1 FROM archivo.pedidos AS a WHERE {self._iguales("pedidos")})
+                      AND NOT EXISTS (
+                          SELECT 1 FROM main.detalles_pedido AS d WHERE d.pedido_id = m.id
+                            AND NOT EXISTS (SELECT 1 FROM archivo.detalles_pedido AS a WHERE {self._iguales("detalles_pedido", "d")})
+                      )
+                """
+                # Las claves de idempotencia solo sirven mientras el pedido puede reenviarse
+                conn.execute(text(f"DELETE FROM main.claves_pedido WHERE pedido_id IN ({verificados})"))
+                conn.execute(text(f"UPDATE temp.archivar_ids SET verificado = 1 WHERE id IN ({verificados})"))
+                version_previa = conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM cambios").scalar()
+
+                conn.execute(text(f"DELETE FROM main.detalles_pedido WHERE pedido_id IN ({ids_verificados})"))
+                movidos = conn.execute(text(f"DELETE FROM main.pedidos WHERE id IN ({ids_verificados})")).rowcount
+
+                # Los triggers registran cada borrado; son pedidos cerrados que
+                # ningún consumidor de `cambios` necesita
+                conn.exec_driver_sql(
+                    "DELETE FROM cambios WHERE version > ? AND tabla = 'pedidos' AND operacion = 'D'",
+                    (version_previa,)
+                )
+                conn.commit()
+
+                # Los que cambiaron siguen en la base viva: se quita su copia
+                # vieja para que la próxima ejecución los vuelva a copiar
+                conn.execute(text(f"DELETE FROM archivo.detalles_pedido WHERE pedido_id IN ({ids_cambiados})"))
+                conn.execute(text(f"DELETE FROM archivo.pedidos WHERE id IN ({ids_cambiados})"))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.exec_driver_sql("DROP TABLE IF EXISTS temp.archivar_ids")
+                conn.exec_driver_sql("DETACH DATABASE archivo")
+                conn.commit()
+
+        if movidos < seleccionados:
+            print(f"Archivo {anio}: {seleccionados - movidos} pedidos cambiaron durante la copia; quedan en la base para la próxima ejecución")
+        return movidos
+
+    def _iguales(self, tabla, fila="m"):
+        """Condición: la fila `a` del archivo es idéntica a `fila` de la base viva"""
+        columnas = [c.name for c in Base.metadata.tables[tabla].columns]
+        return " AND ".join([f"a.id = {fila}.id"] + [f"a.{c} IS {fila}.{c}" for c in columnas if c != "id"])
+
+    def _copiar(self, conn, tabla, condicion, reemplazar=False):
+        """
+        Copia filas de la base viva al archivo adjunto.
+
+        Sin `reemplazar` es un INSERT simple: un id ya archivado con otro
+        contenido hace fallar el archivado en vez de pisarlo. Las filas
+        idénticas (de una ejecución interrumpida) se saltan.
+        """
+        columnas = [c.name for c in Base.metadata.tables[tabla].columns]
+        lista = ", ".join(columnas)
+        if reemplazar:
+            conn.execute(text(
+                f"INSERT OR REPLACE INTO archivo.{tabla} ({lista}) "
+                f"SELECT {lista} FROM main.{tabla} WHERE {condicion}"
+            ))
+            return
+
+        conn.execute(text(
+            f"INSERT INTO archivo.{tabla} ({lista}) "
+            f"SELECT {', '.join('m.' + c for c in columnas)} FROM main.{tabla} AS m "
+            f"WHERE {condicion} AND NOT EXISTS (SELECT 1 FROM archivo.{tabla} AS a WHERE {self._iguales(tabla)})"
+        ))
+
+    def _reservar_ids(self):
+        """
+        Lleva sqlite_sequence de la base viva por encima de los ids ya
+        archivados, por si se archivó antes de que las tablas usaran
+        AUTOINCREMENT.
+        """
+        maximos = {"pedidos": 0, "detalles_pedido": 0}
+        for ruta in sorted(self.archivo_dir.glob("pedidos_*.db")):
+            with self.sesion(ruta) as db:
+                for tabla in maximos:
+                    maximo = db.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}")).scalar()
+                    maximos[tabla] = max(maximos[tabla], maximo)
+
+        with self.engine.begin() as conn:
+            for tabla, maximo in maximos.items():
+                parametros = {"tabla": tabla, "maximo": maximo}
+                conn.execute(text(
+                    "UPDATE sqlite_sequence SET seq = :maximo WHERE name = :tabla AND seq < :maximo"
+                ), parametros)
+                conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT :tabla, :maximo "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :tabla)"
+                ), parametros)
+
+    # ===== CONSULTA =====
+    def archivos_entre(self, inicio, fin):
+        """Archivos existentes que pueden contener pedidos entre dos fechas"""
+        rutas = (self.ruta_archivo(anio) for anio in range(inicio.year, fin.year + 1))
+        return [ruta for ruta in rutas if ruta.exists()]
+
+    @contextmanager
+    def sesion(self, ruta):
+        engine = create_engine(f"sqlite:///{ruta}")
+        db = sessionmaker(bind=engine)()
+        try:
+            yield db
+        finally:
+            db.close()
+            engine.dispose()
+
+    def consultar_pedidos(self, inicio, fin, estados):
+        """
+        Pedidos archivados entre dos fechas, con mesa y detalles ya cargados
+        para poder usarlos después de cerrar la sesión del archivo.
+        """
+        pedidos = []
+        for ruta in self.archivos_entre(inicio, fin):
+            with self.sesion(ruta) as db:
+                pedidos.extend(consulta_pedidos(db, inicio, fin, estados).all())
+        return pedidos
+
+
+def consulta_pedidos(db, inicio, fin, estados):
+    """Pedidos en un rango de fechas con mesa, detalles y productos precargados"""
+    return db.query(Pedido).options(
+        joinedload(Pedido.mesa),
+        selectinload(Pedido.detalles).joinedload(DetallePedido.producto)
+    ).filter(
+        Pedido.fecha_hora >= inicio,
+        Pedido.fecha_hora <= fin,
+        Pedido.estado.in_(estados)
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archiva los pedidos cerrados antiguos de BomApettite")
+    parser.add_argument("--dias", type=int, default=Archivador.DIAS_DEFAULT, help="Antigüedad mínima de los pedidos a archivar")
+    parser.add_argument("--sin-vacuum", action="store_true", help="No compactar la base tras archivar")
+    args = parser.parse_args()
+
+    archivados = Archivador().archivar(dias=args.dias, vacuum=not args.sin_vacuum)
+    for anio, cantidad in sorted(archivados.items()):
+        print(f"{anio}: {cantidad} pedidos archivados")
@@ -0,0 +1,107 @@
+# core/miniaturas.py
+import os
+import threading
+from pathlib import Path
+
+
+class GeneradorMiniaturas:
+    """Genera y cachea en disco variantes redimensionadas de las imágenes del menú"""
+
+    # Ancho máximo en px; la carta muestra las fotos a lo ancho de la tarjeta
+    TAMANOS = {'mini': 480, 'detalle': 960}
+    FORMATOS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+    CALIDAD = 80
+
+    def __init__(self, imagenes_dir=None, cache_dir=None):
+        if imagenes_dir is None:
+            from config.settings import Settings
+            imagenes_dir = Settings.IMAGES_DIR
+        self.imagenes_dir = Path(imagenes_dir)
+        self.cache_dir = Path(cache_dir) if cache_dir else self.imagenes_dir / ".variantes"
+        self._lock = threading.Lock()
+
+    def origen(self, nombre):
+        """Ruta de la imagen original, o None si el nombre no es un archivo del directorio"""
+        if not nombre or Path(nombre).name != nombre or nombre.startswith('.'):
+            return None
+        ruta = self.imagenes_dir / nombre
+        return ruta if ruta.is_file() else None
+
+    def version(self, nombre):
+        """Sello para invalidar la caché del navegador cuando cambia la foto"""
+        ruta = self.origen(nombre)
+        return int(ruta.stat().st_mtime) if ruta else 0
+
+    def sello(self):
+        """
+        Sello del conjunto de originales (nombre, mtime y tamaño de cada una).
+
+        Cambia al reemplazar una foto aunque conserve el nombre, que no altera
+        el mtime del directorio; sirve para invalidar lo que lleva `?v=` ya
+        calculado.
+        """
+        try:
+            with os.scandir(self.imagenes_dir) as entradas:
+                stats = ((e.name, e.stat()) for e in entradas if not e.name.startswith('.') and e.is_file())
+                return hash(frozenset((nombre, st.st_mtime_ns, st.st_size) for nombre, st in stats))
+        except OSError:
+            return None
+
+    def urls(self, nombre):
+        """URLs de las variantes para `srcset`, versionadas con el mtime de la original"""
+        v = self.version(nombre)
+        return {
+            'srcset': ", ".join(
+                f"/miniaturas/{tamano}/{nombre}.webp?v={v} {ancho}w"
+                for tamano, ancho in self.TAMANOS.items()
+            ),
+            'mini': f"/miniaturas/mini/{nombre}.jpg?v={v}",
+            'detalle': f"/miniaturas/detalle/{nombre}.jpg?v={v}",
+        }
+
+    def obtener(self, nombre, tamano, formato):
+        """Ruta de la variante pedida, generándola si falta o quedó vieja"""
+        if tamano not in self.TAMANOS or formato not in self.FORMATOS:
+            return None
+        origen = self.origen(nombre)
+        if origen is None:
+            return None
+
+        destino = self.cache_dir / tamano / f"{nombre}.{formato}"
+        if self._vigente(destino, origen):
+            return destino
+
+        with self._lock:
+            if not self._vigente(destino, origen):
+                self._generar(origen, destino, self.TAMANOS[tamano], self.FORMATOS[formato])
+        return destino
+
+    def _vigente(self, destino, origen):
+        try:
+            return destino.stat().st_mtime >= origen.stat().st_mtime
+        except OSError:
+            return False
+
+    def _generar(self, origen, destino, ancho, formato):
+        from PIL import Image, ImageOps
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        with Image.open(origen) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.width > ancho:
+                alto = round(img.height * ancho / img.width)
+                img = img.resize((ancho, alto), Image.LANCZOS)
+
+            if formato == 'JPEG' and img.mode != 'RGB':
+                fondo = Image.new('RGB', img.size, (255, 255, 255))
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGBA')
+                    fondo.paste(img, mask=img.getchannel('A'))
+                else:
+                    fondo.paste(img.convert('RGB'))
+                img = fondo
+
+            # Escritura atómica: otro worker puede estar sirviendo el mismo archivo
+            temporal = destino.with_name(f".{destino.name}.{os.getpid()}.tmp")
+            img.save(temporal, formato, quality=self.CALIDAD, optimize=True)
+            os.replace(temporal, destino)
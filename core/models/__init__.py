@@ -1,3 +1,3 @@
-from core.models.models import Mesa, Producto, Pedido, DetallePedido, Base
+from core.models.models import Mesa, Producto, Pedido, DetallePedido, Cambio, ClavePedido, SesionMesa, PedidoSesion, Base
 
-__all__ = ['Mesa', 'Producto', 'Pedido', 'DetallePedido', 'Base']
\ No newline at end of file
+__all__ = ['Mesa', 'Producto', 'Pedido', 'DetallePedido', 'Cambio', 'ClavePedido', 'SesionMesa', 'PedidoSesion', 'Base']
\ No newline at end of file
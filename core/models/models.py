@@ -1,8 +1,10 @@
 # core/models/models.py 
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean, Index, func, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.schema import CreateTable
+from datetime import datetime, timedelta
 
 Base = declarative_base()
 
@@ -48,9 +50,20 @@ class Producto(Base):
 
 class Pedido(Base):
     __tablename__ = 'pedidos'
+    # AUTOINCREMENT: un id archivado no se reasigna a un pedido nuevo
+    __table_args__ = {'sqlite_autoincrement': True}
     
     ESTADOS = ['pendiente', 'preparando', 'listo', 'entregado', 'cancelado']
     
+    # Transiciones aceptadas en los cambios de estado masivos (solo hacia adelante)
+    TRANSICIONES = {
+        'pendiente': ['preparando', 'listo', 'entregado', 'cancelado'],
+        'preparando': ['listo', 'entregado', 'cancelado'],
+        'listo': ['entregado', 'cancelado'],
+        'entregado': [],
+        'cancelado': []
+    }
+    
     id = Column(Integer, primary_key=True)
     mesa_id = Column(Integer, ForeignKey('mesas.id'))
     fecha_hora = Column(DateTime, default=datetime.now)
@@ -61,6 +74,9 @@ class Pedido(Base):
     mesa = relationship("Mesa", back_populates="pedidos")
     detalles = relationship("DetallePedido", back_populates="pedido", cascade="all, delete-orphan")
     
+    def puede_pasar_a(self, estado):
+        return estado in self.TRANSICIONES.get(self.estado, [])
+    
     def calcular_total(self):
         total = sum(d.cantidad * d.precio_unitario for d in self.detalles)
         self.total = total
@@ -68,6 +84,7 @@ class Pedido(Base):
 
 class DetallePedido(Base):
     __tablename__ = 'detalles_pedido'
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = Column(Integer, primary_key=True)
     pedido_id = Column(Integer, ForeignKey('pedidos.id'))
@@ -79,4 +96,366 @@ class DetallePedido(Base):
     producto = relationship("Producto", back_populates="detalles_pedido")
     
     def subtotal(self):
-        return self.cantidad * self.precio_unitario
\ No newline at end of file
+        return self.cantidad * self.precio_unitario
+
+class Cambio(Base):
+    """Registro de cambios de productos y pedidos, escrito por triggers de SQLite.
+    
+    Lo alimenta cualquier proceso que escriba en la base (workers del servidor
+    o la aplicación de escritorio), por eso sirve para invalidar caches y
+    propagar eventos entre procesos.
+    """
+    __tablename__ = 'cambios'
+    __table_args__ = (
+        Index('ix_cambios_tabla_version', 'tabla', 'version'),
+        {'sqlite_autoincrement': True},
+    )
+    
+    TABLAS = ['productos', 'pedidos']
+    RETENCION_DIAS = 7
+    
+    version = Column(Integer, primary_key=True)
+    tabla = Column(String(30), nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    operacion = Column(String(1), nullable=False)  # I, U, D
+    fecha_hora = Column(DateTime, default=datetime.now)
+    
+    @staticmethod
+    def version_actual(db, tabla):
+        """Última versión registrada para una tabla (0 si no hay cambios)"""
+        return db.query(func.max(Cambio.version)).filter(Cambio.tabla == tabla).scalar() or 0
+    
+    @staticmethod
+    def purgar(conn, dias=None):
+        """
+        Borra los cambios con más de `dias` (RETENCION_DIAS) de antigüedad.
+        
+        Se conserva el último de cada tabla para que la versión publicada
+        (menú, pedidos) no retroceda; quien quede detrás del historial
+        recarga completo.
+        """
+        limite = datetime.now() - timedelta(days=Cambio.RETENCION_DIAS if dias is None else dias)
+        return conn.execute(text("""
+            DELETE FROM cambios
+            WHERE fecha_hora < :limite
+              AND version < (SELECT MAX(version) FROM cambios AS c WHERE c.tabla = cambios.tabla)
+        """), {"limite": limite.strftime("%Y-%m-%d %H:%M:%S")}).rowcount
+
+
+class ClavePedido(Base):
+    """Clave de idempotencia con la que la carta envía un pedido.
+    
+    Si el cliente reintenta (p. ej. al reenviar su cola sin conexión) con la
+    misma clave, se responde con el pedido ya creado en vez de duplicarlo.
+    """
+    __tablename__ = 'claves_pedido'
+    
+    clave = Column(String(64), primary_key=True)
+    pedido_id = Column(Integer, ForeignKey('pedidos.id'), nullable=False)
+    fecha_hora = Column(DateTime, default=datetime.now)
+
+
+class SesionMesa(Base):
+    """Cuenta de una mesa: agrupa sus pedidos desde que se sienta hasta que paga.
+    
+    Los totales los mantienen triggers de SQLite en cada alta, cambio de
+    total o de estado de un pedido (venga del servidor o del escritorio), así
+    la cuenta se lee sin recorrer pedidos. Los cancelados no suman.
+    
+    Se cierra al cobrar o, si nadie la cierra, tras INACTIVIDAD_HORAS sin
+    movimiento: el siguiente pedido de la mesa abre una cuenta nueva.
+    """
+    __tablename__ = 'sesiones_mesa'
+    __table_args__ = (
+        # Una sola cuenta abierta por mesa
+        Index('ux_sesiones_mesa_abierta', 'mesa_id', unique=True, sqlite_where=text('cerrada_en IS NULL')),
+    )
+    
+    ABIERTOS = ('pendiente', 'preparando', 'listo')
+    INACTIVIDAD_HORAS = 4
+    
+    id = Column(Integer, primary_key=True)
+    mesa_id = Column(Integer, ForeignKey('mesas.id'), nullable=False)
+    abierta_en = Column(DateTime, default=datetime.now)
+    cerrada_en = Column(DateTime)
+    ultimo_movimiento = Column(DateTime, default=datetime.now)
+    total = Column(Float, default=0.0)
+    pedidos = Column(Integer, default=0)            # no cancelados
+    pedidos_abiertos = Column(Integer, default=0)   # pendientes, en preparación o listos
+    
+    mesa = relationship("Mesa")
+    
+    @staticmethod
+    def vigente():
+        """Condición de cuenta abierta; las inactivas cuentan como cerradas aunque el barrido no haya pasado"""
+        limite = datetime.now() - timedelta(hours=SesionMesa.INACTIVIDAD_HORAS)
+        return (SesionMesa.cerrada_en.is_(None)) & (SesionMesa.ultimo_movimiento >= limite)
+    
+    @staticmethod
+    def abierta(db, mesa_id):
+        return db.query(SesionMesa).filter(SesionMesa.mesa_id == mesa_id, SesionMesa.vigente()).first()
+    
+    @staticmethod
+    def cerrar_inactivas(conn):
+        """Cierra, con la hora de su último movimiento, las cuentas que nadie cerró"""
+        inactiva = _sesion_inactiva("datetime('now', 'localtime')")
+        return conn.execute(text(
+            f"UPDATE sesiones_mesa SET cerrada_en = ultimo_movimiento WHERE cerrada_en IS NULL AND {inactiva}"
+        )).rowcount
+
+class PedidoSesion(Base):
+    """Sesión a la que pertenece cada pedido (la asigna el trigger de alta)"""
+    __tablename__ = 'pedidos_sesion'
+    __table_args__ = (
+        Index('ix_pedidos_sesion_sesion', 'sesion_id'),
+    )
+    
+    pedido_id = Column(Integer, ForeignKey('pedidos.id'), primary_key=True)
+    sesion_id = Column(Integer, ForeignKey('sesiones_mesa.id'), nullable=False)
+
+
+def _triggers_cambios():
+    for tabla in Cambio.TABLAS:
+        for evento, operacion, fila in (('INSERT', 'I', 'NEW'), ('UPDATE', 'U', 'NEW'), ('DELETE', 'D', 'OLD')):
+            yield f"""
+                CREATE TRIGGER IF NOT EXISTS {tabla}_cambio_{operacion.lower()} AFTER {evento} ON {tabla}
+                BEGIN
+                    INSERT INTO cambios (tabla, registro_id, operacion, fecha_hora)
+                    VALUES ('{tabla}', {fila}.id, '{operacion}', datetime('now', 'localtime'));
+                END
+            """
+
+# Sesión sin movimiento en las INACTIVIDAD_HORAS previas a `ahora` (expresión SQL)
+def _sesion_inactiva(ahora):
+    return f"ultimo_movimiento < datetime({ahora}, '-{SesionMesa.INACTIVIDAD_HORAS} hours')"
+
+# Aporte de un pedido a los totales de su sesión
+def _aporte_sesion(fila):
+    abiertos = ", ".join(f"'{e}'" for e in SesionMesa.ABIERTOS)
+    return {
+        "total": f"(CASE WHEN {fila}.estado = 'cancelado' THEN 0 ELSE COALESCE({fila}.total, 0) END)",
+        "pedidos": f"(CASE WHEN {fila}.estado = 'cancelado' THEN 0 ELSE 1 END)",
+        "pedidos_abiertos": f"(CASE WHEN {fila}.estado IN ({abiertos}) THEN 1 ELSE 0 END)",
+    }
+
+def _ddl_sesiones():
+    nuevo, viejo = _aporte_sesion("NEW"), _aporte_sesion("OLD")
+    sesion_de = "(SELECT sesion_id FROM pedidos_sesion WHERE pedido_id = {}.id)"
+    abiertos = ", ".join(f"'{e}'" for e in SesionMesa.ABIERTOS)
+    ahora = "datetime('now', 'localtime')"
+    fecha = f"COALESCE(NEW.fecha_hora, {ahora})"
+    return [
+        # El primer pedido de una mesa sin cuenta abierta la abre; si la
+        # anterior quedó inactiva, primero la cierra
+        "DROP TRIGGER IF EXISTS pedidos_sesion_i",
+        f"""
+        CREATE TRIGGER pedidos_sesion_i AFTER INSERT ON pedidos
+        WHEN NEW.mesa_id IS NOT NULL
+        BEGIN
+            UPDATE sesiones_mesa SET cerrada_en = ultimo_movimiento
+            WHERE mesa_id = NEW.mesa_id AND cerrada_en IS NULL AND {_sesion_inactiva(fecha)};
+            
+            INSERT INTO sesiones_mesa (mesa_id, abierta_en, ultimo_movimiento, total, pedidos, pedidos_abiertos)
+            SELECT NEW.mesa_id, {fecha}, {fecha}, 0, 0, 0
+            WHERE NOT EXISTS (SELECT 1 FROM sesiones_mesa WHERE mesa_id = NEW.mesa_id AND cerrada_en IS NULL);
+            
+            INSERT INTO pedidos_sesion (pedido_id, sesion_id)
+            SELECT NEW.id, id FROM sesiones_mesa WHERE mesa_id = NEW.mesa_id AND cerrada_en IS NULL;
+            
+            UPDATE sesiones_mesa SET
+                total = ROUND(total + {nuevo['total']}, 2),
+                pedidos = pedidos + {nuevo['pedidos']},
+                pedidos_abiertos = pedidos_abiertos + {nuevo['pedidos_abiertos']},
+                ultimo_movimiento = MAX(ultimo_movimiento, {fecha})
+            WHERE id = {sesion_de.format('NEW')};
+        END
+        """,
+        # Una cuenta cerrada conserva lo cobrado; solo sigue contando los
+        # pedidos sin entregar (cierres con forzar=true)
+        "DROP TRIGGER IF EXISTS pedidos_sesion_u",
+        f"""
+        CREATE TRIGGER pedidos_sesion_u AFTER UPDATE OF total, estado ON pedidos
+        BEGIN
+            UPDATE sesiones_mesa SET cerrada_en = ultimo_movimiento
+            WHERE id = {sesion_de.format('NEW')} AND cerrada_en IS NULL AND {_sesion_inactiva(ahora)};
+            
+            UPDATE sesiones_mesa SET
+                total = ROUND(total - {viejo['total']} + {nuevo['total']}, 2),
+                pedidos = pedidos - {viejo['pedidos']} + {nuevo['pedidos']},
+                ultimo_movimiento = {ahora}
+            WHERE id = {sesion_de.format('NEW')} AND cerrada_en IS NULL;
+            
+            UPDATE sesiones_mesa SET
+                pedidos_abiertos = pedidos_abiertos - {viejo['pedidos_abiertos']} + {nuevo['pedidos_abiertos']}
+            WHERE id = {sesion_de.format('NEW')};
+        END
+        """,
+        # Borrar un pedido (o archivarlo) no altera cuentas ya cerradas
+        f"""
+        CREATE TRIGGER IF NOT EXISTS pedidos_sesion_d AFTER DELETE ON pedidos
+        BEGIN
+            UPDATE sesiones_mesa SET
+                total = ROUND(total - {viejo['total']}, 2),
+                pedidos = pedidos - {viejo['pedidos']},
+                pedidos_abiertos = pedidos_abiertos - {viejo['pedidos_abiertos']}
+            WHERE id = {sesion_de.format('OLD')} AND cerrada_en IS NULL;
+            
+            DELETE FROM pedidos_sesion WHERE pedido_id = OLD.id;
+        END
+        """,
+        # Bases anteriores: las mesas con pedidos en curso arrancan con su cuenta abierta
+        f"""
+        INSERT INTO sesiones_mesa (mesa_id, abierta_en, total, pedidos, pedidos_abiertos)
+        SELECT mesa_id, MIN(fecha_hora), 0, 0, 0 FROM pedidos AS p
+        WHERE estado IN ({abiertos}) AND mesa_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM pedidos_sesion WHERE pedido_id = p.id)
+          AND NOT EXISTS (SELECT 1 FROM sesiones_mesa AS s WHERE s.mesa_id = p.mesa_id AND s.cerrada_en IS NULL)
+        GROUP BY mesa_id
+        """,
+        f"""
+        INSERT INTO pedidos_sesion (pedido_id, sesion_id)
+        SELECT p.id, s.id FROM pedidos AS p
+        JOIN sesiones_mesa AS s ON s.mesa_id = p.mesa_id AND s.cerrada_en IS NULL
+        WHERE p.estado IN ({abiertos})
+          AND NOT EXISTS (SELECT 1 FROM pedidos_sesion WHERE pedido_id = p.id)
+        """,
+        """
+        UPDATE sesiones_mesa SET ultimo_movimiento = COALESCE((
+            SELECT MAX(p.fecha_hora) FROM pedidos_sesion AS ps JOIN pedidos AS p ON p.id = ps.pedido_id
+            WHERE ps.sesion_id = sesiones_mesa.id
+        ), abierta_en)
+        WHERE ultimo_movimiento IS NULL
+        """,
+        _RECALCULAR_SESIONES,
+    ]
+
+# Recalcula desde cero los totales de las cuentas abiertas
+_RECALCULAR_SESIONES = f"""
+    UPDATE sesiones_mesa SET
+        total = (
+            SELECT ROUND(COALESCE(SUM({_aporte_sesion('p')['total']}), 0), 2)
+            FROM pedidos_sesion AS ps JOIN pedidos AS p ON p.id = ps.pedido_id
+            WHERE ps.sesion_id = sesiones_mesa.id
+        ),
+        pedidos = (
+            SELECT COALESCE(SUM({_aporte_sesion('p')['pedidos']}), 0)
+            FROM pedidos_sesion AS ps JOIN pedidos AS p ON p.id = ps.pedido_id
+            WHERE ps.sesion_id = sesiones_mesa.id
+        ),
+        pedidos_abiertos = (
+            SELECT COALESCE(SUM({_aporte_sesion('p')['pedidos_abiertos']}), 0)
+            FROM pedidos_sesion AS ps JOIN pedidos AS p ON p.id = ps.pedido_id
+            WHERE ps.sesion_id = sesiones_mesa.id
+        )
+    WHERE cerrada_en IS NULL
+"""
+
+# Índice de búsqueda de texto completo (FTS5) sobre productos; remove_diacritics
+# pliega acentos y mayúsculas tanto al indexar como al consultar ("cafe" -> "Café")
+_DDL_BUSQUEDA = [
+    """
+    CREATE VIRTUAL TABLE productos_fts USING fts5(
+        nombre, descripcion, categoria,
+        content='productos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_i AFTER INSERT ON productos
+    BEGIN
+        INSERT INTO productos_fts (rowid, nombre, descripcion, categoria)
+        VALUES (NEW.id, NEW.nombre, NEW.descripcion, NEW.categoria);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_d AFTER DELETE ON productos
+    BEGIN
+        INSERT INTO productos_fts (productos_fts, rowid, nombre, descripcion, categoria)
+        VALUES ('delete', OLD.id, OLD.nombre, OLD.descripcion, OLD.categoria);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_u AFTER UPDATE ON productos
+    BEGIN
+        INSERT INTO productos_fts (productos_fts, rowid, nombre, descripcion, categoria)
+        VALUES ('delete', OLD.id, OLD.nombre, OLD.descripcion, OLD.categoria);
+        INSERT INTO productos_fts (rowid, nombre, descripcion, categoria)
+        VALUES (NEW.id, NEW.nombre, NEW.descripcion, NEW.categoria);
+    END
+    """,
+    "INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')",
+]
+
+def _crear_indice_busqueda(conn):
+    existe = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'"
+    )).first()
+    if existe:
+        return
+    for ddl in _DDL_BUSQUEDA:
+        conn.execute(text(ddl))
+
+def _migrar_autoincremento(conn):
+    """
+    Bases anteriores: reconstruye pedidos y detalles con AUTOINCREMENT.
+    
+    Sin él SQLite reutiliza el id más alto tras borrarlo, y un pedido
+    archivado chocaría con uno nuevo. Los triggers de la tabla se pierden
+    con el DROP y se recrean después.
+    """
+    for tabla in (Pedido.__table__, DetallePedido.__table__):
+        ddl = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nombre"
+        ), {"nombre": tabla.name}).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            continue
+        
+        nueva = f"{tabla.name}_nueva"
+        crear = str(CreateTable(tabla).compile(dialect=conn.dialect))
+        conn.exec_driver_sql(crear.replace(f"CREATE TABLE {tabla.name} (", f"CREATE TABLE {nueva} (", 1))
+        columnas = ", ".join(c.name for c in tabla.columns)
+        conn.exec_driver_sql(f"INSERT INTO {nueva} ({columnas}) SELECT {columnas} FROM {tabla.name}")
+        conn.exec_driver_sql(f"DROP TABLE {tabla.name}")
+        conn.exec_driver_sql(f"ALTER TABLE {nueva} RENAME TO {tabla.name}")
+        for indice in tabla.indexes:
+            indice.create(conn)
+
+def _migrar_sesiones(conn):
+    """Bases anteriores: agrega la columna de último movimiento (se rellena en _ddl_sesiones)"""
+    columnas = [fila[1] for fila in conn.exec_driver_sql("PRAGMA table_info(sesiones_mesa)")]
+    if "ultimo_movimiento" not in columnas:
+        conn.exec_driver_sql("ALTER TABLE sesiones_mesa ADD COLUMN ultimo_movimiento DATETIME")
+
+# Se guarda en PRAGMA user_version; incrementar al agregar tablas, triggers o índices
+ESQUEMA_VERSION = 6
+
+def preparar_esquema(engine):
+    """
+    Crea tablas, triggers e índice de búsqueda que falten.
+    
+    Si la base ya tiene la versión de esquema actual solo cuesta un PRAGMA.
+    """
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() == ESQUEMA_VERSION:
+            return
+    
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _migrar_autoincremento(conn)
+        _migrar_sesiones(conn)
+        for ddl in _triggers_cambios():
+            conn.execute(text(ddl))
+        for ddl in _ddl_sesiones():
+            conn.execute(text(ddl))
+    try:
+        with engine.begin() as conn:
+            _crear_indice_busqueda(conn)
+    except OperationalError as e:
+        # Otro proceso lo creó entre la comprobación y el CREATE
+        if "already exists" not in str(e):
+            # SQLite compilado sin FTS5: la búsqueda cae a LIKE
+            print(f"Índice de búsqueda no disponible: {e}")
+    
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {ESQUEMA_VERSION}")
@@ -1,6 +1,4 @@
 # core/qr_generator.py (versión corregida completa)
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
 
 class GeneradorQR:
@@ -14,6 +12,10 @@ class GeneradorQR:
         
     def generar_qr_mesa(self, mesa_id: int, ip_local: str, puerto: int, nombre_mesa: str):
         """Genera un código QR para una mesa específica"""
+        # Importación diferida: qrcode/PIL solo se cargan al generar un QR
+        import qrcode
+        from PIL import Image, ImageDraw, ImageFont
+        
         try:
             url = f"http://{ip_local}:{puerto}/?mesa={mesa_id}"
             
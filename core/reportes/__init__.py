@@ -1,4 +1,10 @@
 # core/reportes/__init__.py
-from .excel_generator import ExcelGenerator
+__all__ = ['ExcelGenerator']
 
-__all__ = ['ExcelGenerator']
\ No newline at end of file
+
+def __getattr__(nombre):
+    # pandas/openpyxl se importan recién al usar el generador
+    if nombre == 'ExcelGenerator':
+        from .excel_generator import ExcelGenerator
+        return ExcelGenerator
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
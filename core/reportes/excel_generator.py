@@ -5,7 +5,7 @@ from pathlib import Path
 from sqlalchemy import func, extract
 from config.database import get_db_session
 from config.settings import Settings
-from core.models.models import Pedido, DetallePedido, Producto, Mesa
+from core.archivado import Archivador, consulta_pedidos
 
 class ExcelGenerator:
     def __init__(self):
@@ -57,13 +57,11 @@ class ExcelGenerator:
         dt_inicio = datetime.combine(fecha_inicio, datetime.min.time())
         dt_fin = datetime.combine(fecha_fin, datetime.max.time())
         
-        # Obtener datos
+        # Obtener datos (base en uso + archivos de pedidos antiguos)
+        estados = ['entregado', 'listo']
         with get_db_session() as db:
-            pedidos = db.query(Pedido).filter(
-                Pedido.fecha_hora >= dt_inicio,
-                Pedido.fecha_hora <= dt_fin,
-                Pedido.estado.in_(['entregado', 'listo'])
-            ).all()
+            pedidos = consulta_pedidos(db, dt_inicio, dt_fin, estados).all()
+            pedidos += Archivador().consultar_pedidos(dt_inicio, dt_fin, estados)
             
             return self._crear_excel(pedidos, tipo_periodo, fecha_inicio, fecha_fin)
     
@@ -1,4 +1,10 @@
 # core/server/__init__.py
-from core.server.app import iniciar_servidor
+__all__ = ['iniciar_servidor']
 
-__all__ = ['iniciar_servidor']
\ No newline at end of file
+
+def __getattr__(nombre):
+    # Importar core.server.<submódulo> no debe levantar la app completa
+    if nombre == 'iniciar_servidor':
+        from core.server.app import iniciar_servidor
+        return iniciar_servidor
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -1,27 +1,70 @@
 # core/server/app.py
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from pydantic import BaseModel
-import uvicorn
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 from pathlib import Path
 import shutil
+import hashlib
+import os
 import json
-import time
+import asyncio
 from datetime import datetime
 
 from config.database import SessionLocal, engine
 from config.settings import Settings
-from core.models.models import Base, Mesa, Producto, Pedido, DetallePedido
+from core.models.models import Mesa, Producto, Pedido, DetallePedido, Cambio, ClavePedido, SesionMesa, PedidoSesion, preparar_esquema
+from core.miniaturas import GeneradorMiniaturas
+from core.server.busqueda import buscar_productos, filtro_like
+from core.server.cache import CacheVersionada, sello_archivo
+from core.server.cocina import ColaCocina
+from core.server.formato import negociar, codificar, respuesta, columnas, diccionario
+from core.server.perfilador import Perfilador
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
+# La base se comparte entre workers y la app de escritorio: WAL permite leer
+# mientras otro proceso escribe y busy_timeout espera el lock en vez de fallar
+@event.listens_for(engine, "connect")
+def _configurar_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
 
-app = FastAPI(title="BomApettite Server", version="1.0.0")
+# Cada cuánto se cierran cuentas inactivas y se purga `cambios` mientras el servidor corre
+MANTENIMIENTO_SEGUNDOS = 3600
+
+def _mantenimiento():
+    with engine.begin() as conn:
+        SesionMesa.cerrar_inactivas(conn)
+        Cambio.purgar(conn)
+
+async def _mantenimiento_periodico():
+    while True:
+        await asyncio.sleep(MANTENIMIENTO_SEGUNDOS)
+        try:
+            await run_in_threadpool(_mantenimiento)
+        except Exception as e:
+            print(f"Error en mantenimiento periódico: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Crear tablas y triggers al arrancar (no al importar); con el esquema al
+    # día es un solo PRAGMA por worker
+    preparar_esquema(engine)
+    _mantenimiento()
+    tarea = asyncio.create_task(_mantenimiento_periodico())
+    yield
+    tarea.cancel()
+
+app = FastAPI(title="BomApettite Server", version="1.0.0", lifespan=lifespan)
 
 # ===== MIDDLEWARE ANTI-CACHÉ =====
 class NoCacheMiddleware(BaseHTTPMiddleware):
@@ -45,7 +88,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory=str(Settings.BASE_DIR / "core" / "server" / "static")), name="static")
+STATIC_DIR = Settings.BASE_DIR / "core" / "server" / "static"
+
+app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 app.mount("/images", StaticFiles(directory=str(Settings.IMAGES_DIR)), name="images")
 app.mount("/assets", StaticFiles(directory=str(Settings.ASSETS_DIR)), name="assets")
 
@@ -57,8 +102,20 @@ def get_db():
     finally:
         db.close()
 
+# ===== CACHES POR PROCESO =====
+# Se invalidan por el mtime de local.json o por la versión de la tabla `cambios`,
+# que ven igual todos los workers
+CONFIG_FILE = Settings.BASE_DIR / "config" / "local.json"
+
+_cache_config = CacheVersionada(maximo=1)
+_cache_html = CacheVersionada(maximo=1)
+_cache_menu = CacheVersionada()
+
 def get_config():
-    config_file = Settings.BASE_DIR / "config" / "local.json"
+    return _cache_config.obtener(sello_archivo(CONFIG_FILE), "config", _leer_config)
+
+def _leer_config():
+    config_file = CONFIG_FILE
     default_config = {
         "nombre_local": "BomApettite",
         "eslogan": "Sistema de Pedidos QR",
@@ -96,9 +153,54 @@ def obtener_logo():
     
     return {"url": None, "existe": False}
 
+# ===== CARTA Y MODO OFFLINE =====
+# Lo que el service worker guarda como "shell" de la carta
+ARCHIVOS_SHELL = [STATIC_DIR / "css" / "carta.css", STATIC_DIR / "js" / "carta.js", STATIC_DIR / "js" / "sw.js"]
+
+def _version_shell():
+    """Cambia cuando cambian el HTML (configuración, logo), el CSS, el JS o el service worker"""
+    logo_path = get_config().get("logo_path")
+    sellos = [sello_archivo(ruta) for ruta in ARCHIVOS_SHELL]
+    sellos += [sello_archivo(CONFIG_FILE), sello_archivo(logo_path) if logo_path else None]
+    return hashlib.sha1(repr(sellos).encode()).hexdigest()[:12]
+
 @app.get("/", response_class=HTMLResponse)
 async def carta_principal():
     config = get_config()
+    version = _version_shell()
+    html_content = _cache_html.obtener(version, "carta", lambda: _generar_carta(config, version))
+    return HTMLResponse(content=html_content)
+
+@app.get("/sw.js")
+def service_worker():
+    # Servido desde la raíz para que su alcance cubra la carta ("/")
+    return FileResponse(
+        STATIC_DIR / "js" / "sw.js",
+        media_type="application/javascript",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/api/offline/manifest")
+def obtener_manifiesto_offline():
+    """
+    Recursos que el service worker precachea. `version` cambia con el shell;
+    el menú se guarda aparte y se refresca en segundo plano en cada uso.
+    """
+    config = get_config()
+    version = _version_shell()
+    shell = ["/", f"/static/css/carta.css?v={version}", f"/static/js/carta.js?v={version}"]
+    logo_path = config.get("logo_path")
+    if logo_path and Path(logo_path).exists():
+        shell.append(f"/assets/{Path(logo_path).name}?v={version}")
+    
+    return {
+        "version": version,
+        "shell": shell,
+        "menu": "/api/menu?formato=compacto",
+        "runtime": ["/images/", "/miniaturas/", "/assets/"]
+    }
+
+def _generar_carta(config, version):
     nombre = config.get("nombre_local", "BomApettite")
     eslogan = config.get("eslogan", "")
     mensaje = config.get("mensaje_bienvenida", "¡Bienvenido!")
@@ -113,8 +215,6 @@ async def carta_principal():
     if logo_path and Path(logo_path).exists():
         logo_url = f"/assets/{Path(logo_path).name}"
     
-    timestamp = int(time.time())
-    
     html_content = f"""<!DOCTYPE html>
 <html lang="es">
 <head>
@@ -129,7 +229,7 @@ async def carta_principal():
     
     <title>{nombre} - Carta Digital</title>
     
-    <link rel="stylesheet" href="/static/css/carta.css?v={timestamp}">
+    <link rel="stylesheet" href="/static/css/carta.css?v={version}">
     
     <style>
         :root {{
@@ -197,7 +297,7 @@ async def carta_principal():
 <body>
     <div id="app">
         <header class="header">
-            {f'<img src="{logo_url}?v={timestamp}" class="logo-header" alt="Logo">' if logo_url else ''}
+            {f'<img src="{logo_url}?v={version}" class="logo-header" alt="Logo">' if logo_url else ''}
             <h1>🍽️ {nombre}</h1>
             {f"<p class='eslogan'>{eslogan}</p>" if eslogan else ""}
             <div class="mesa-badge">Mesa <span id="mesa-num">-</span></div>
@@ -275,31 +375,83 @@ async def carta_principal():
     <script>
         window.MONEDA = "{moneda}";
     </script>
-    <script src="/static/js/carta.js?v={timestamp}"></script>
+    <script src="/static/js/carta.js?v={version}"></script>
 </body>
 </html>"""
     
-    return HTMLResponse(content=html_content)
+    return html_content
 
 @app.get("/api/menu")
 def obtener_menu(
+    request: Request,
+    response: Response,
     categoria: Optional[str] = Query(None, description="Filtrar por categoría"),
-    busqueda: Optional[str] = Query(None, description="Buscar por nombre"),
+    busqueda: Optional[str] = Query(None, description="Buscar en nombre, descripción y categoría (sin distinguir acentos)"),
+    formato: Optional[str] = Query(None, description="json (por defecto), compacto o msgpack; también se negocia por Accept"),
     db: Session = Depends(get_db)
 ):
-    config = get_config()
-    moneda = config.get("moneda", "$").split()[0]
+    version = Cambio.version_actual(db, 'productos')
+    tipo = negociar(request, formato)
+    response.headers["Vary"] = "Accept"
+    if tipo == 'json':
+        construir = lambda: _construir_menu(db, categoria, busqueda, version)
+    else:
+        # Los formatos compactos se cachean ya serializados
+        construir = lambda: codificar(_construir_menu_compacto(db, categoria, busqueda, version), tipo)
     
+    if busqueda:
+        # Las búsquedas (type-ahead) no se cachean para no desalojar el menú completo
+        resultado = construir()
+    else:
+        # Las URLs de imagen llevan ?v= con el mtime de la foto: reemplazar
+        # una también invalida el menú cacheado
+        sello = (version, sello_archivo(CONFIG_FILE), miniaturas.sello())
+        resultado = _cache_menu.obtener(sello, (categoria, tipo), construir)
+    return resultado if tipo == 'json' else respuesta(*resultado)
+
+def _get_moneda():
+    return get_config().get("moneda", "$").split()[0]
+
+def _producto_json(p, moneda):
+    imagen = Path(p.imagen_path).name if p.imagen_path else None
+    variantes = miniaturas.urls(imagen) if imagen else {}
+    return {
+        "id": p.id,
+        "nombre": p.nombre,
+        "descripcion": p.descripcion,
+        "precio": p.precio,
+        "moneda": moneda,
+        "categoria": p.categoria,
+        "imagen": f"/images/{imagen}" if imagen else None,
+        "imagen_mini": variantes.get("mini"),
+        "imagen_srcset": variantes.get("srcset")
+    }
+
+def _consultar_menu(db, categoria, busqueda):
     query = db.query(Producto).filter(Producto.disponible == True)
     
-    if categoria and categoria != "Todas":
+    if categoria == "Todas":
+        categoria = None
+    if categoria:
         query = query.filter(Producto.categoria == categoria)
     
+    ranking = None
     if busqueda:
-        busqueda = busqueda.lower()
-        query = query.filter(Producto.nombre.ilike(f"%{busqueda}%"))
+        ranking = buscar_productos(db, busqueda, categoria)
+        if ranking is None:
+            query = query.filter(filtro_like(busqueda))
+        else:
+            query = query.filter(Producto.id.in_(ranking))
     
     productos = query.order_by(Producto.categoria, Producto.nombre).all()
+    if ranking:
+        posicion = {pid: i for i, pid in enumerate(ranking)}
+        productos.sort(key=lambda p: posicion[p.id])
+    return productos
+
+def _construir_menu(db, categoria, busqueda, version):
+    moneda = _get_moneda()
+    productos = _consultar_menu(db, categoria, busqueda)
     
     menu = {}
     categorias = set()
@@ -309,21 +461,105 @@ def obtener_menu(
         categorias.add(cat)
         if cat not in menu:
             menu[cat] = []
-        menu[cat].append({
-            "id": p.id,
-            "nombre": p.nombre,
-            "descripcion": p.descripcion,
-            "precio": p.precio,
-            "moneda": moneda,
-            "categoria": p.categoria,
-            "imagen": f"/images/{Path(p.imagen_path).name}" if p.imagen_path else None
-        })
+        menu[cat].append(_producto_json(p, moneda))
     
     return {
+        "version": version,
         "menu": menu,
         "categorias": sorted(list(categorias))
     }
 
+def _construir_menu_compacto(db, categoria, busqueda, version):
+    """
+    Menú en columnas: la moneda va una sola vez, la categoría es un índice en
+    `categorias` y de cada imagen solo viaja el archivo y su versión; el
+    cliente arma las URLs con los prefijos de `imagenes`.
+    """
+    productos = _consultar_menu(db, categoria, busqueda)
+    categorias, codigos = diccionario([p.categoria or "General" for p in productos])
+    imagenes = [Path(p.imagen_path).name if p.imagen_path else None for p in productos]
+    
+    return {
+        "version": version,
+        "moneda": _get_moneda(),
+        "categorias": categorias,
+        "imagenes": {
+            "original": "/images/",
+            "miniaturas": "/miniaturas/",
+            "anchos": miniaturas.TAMANOS
+        },
+        "productos": {
+            "id": [p.id for p in productos],
+            "nombre": [p.nombre for p in productos],
+            "descripcion": [p.descripcion for p in productos],
+            "precio": [p.precio for p in productos],
+            "categoria": codigos,
+            "imagen": imagenes,
+            "imagen_v": [miniaturas.version(i) if i else None for i in imagenes]
+        }
+    }
+
+@app.get("/api/menu/changes")
+def obtener_cambios_menu(
+    desde: int = Query(..., alias="since", description="Versión del menú que ya tiene el cliente"),
+    db: Session = Depends(get_db)
+):
+    """
+    Productos agregados, actualizados o retirados desde una versión.
+    
+    `completo: true` indica que el historial no alcanza (versión 0, anterior a
+    la purga de `cambios` o de otra base) y hay que recargar /api/menu.
+    Agregados y actualizados se aplican igual en el cliente (upsert por id).
+    """
+    version = Cambio.version_actual(db, 'productos')
+    respuesta = {"version": version, "completo": False, "agregados": [], "actualizados": [], "eliminados": []}
+    if desde == version:
+        return respuesta
+    
+    minima = db.query(func.min(Cambio.version)).filter(Cambio.tabla == 'productos').scalar() or 0
+    if desde <= 0 or desde > version or desde < minima - 1:
+        respuesta["completo"] = True
+        return respuesta
+    
+    operaciones = {}
+    for registro_id, operacion in db.query(Cambio.registro_id, Cambio.operacion).filter(
+        Cambio.tabla == 'productos',
+        Cambio.version > desde,
+        Cambio.version <= version
+    ):
+        operaciones.setdefault(registro_id, set()).add(operacion)
+    
+    moneda = _get_moneda()
+    productos = {p.id: p for p in db.query(Producto).filter(Producto.id.in_(operaciones)).all()}
+    for producto_id, ops in operaciones.items():
+        p = productos.get(producto_id)
+        if p is None or not p.disponible:
+            respuesta["eliminados"].append(producto_id)
+        elif 'I' in ops:
+            respuesta["agregados"].append(_producto_json(p, moneda))
+        else:
+            respuesta["actualizados"].append(_producto_json(p, moneda))
+    
+    return respuesta
+
+# ===== MINIATURAS =====
+miniaturas = GeneradorMiniaturas()
+
+@app.get("/miniaturas/{tamano}/{archivo}")
+def obtener_miniatura(tamano: str, archivo: str):
+    """Variante redimensionada de una imagen del menú, p.ej. /miniaturas/mini/foto.png.webp"""
+    nombre, _, formato = archivo.rpartition(".")
+    ruta = miniaturas.obtener(nombre, tamano, formato)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    
+    # La URL lleva ?v=<mtime de la original>, así que puede cachearse sin revalidar
+    return FileResponse(
+        ruta,
+        media_type="image/webp" if formato == "webp" else "image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
 @app.get("/api/categorias")
 def obtener_categorias(db: Session = Depends(get_db)):
     categorias = db.query(Producto.categoria).filter(
@@ -339,12 +575,19 @@ class PedidoItem(BaseModel):
 class PedidoRequest(BaseModel):
     items: List[PedidoItem]
     notas: Optional[str] = None
+    # Generada por el cliente; reenviar con la misma clave no duplica el pedido
+    clave: Optional[str] = Field(None, max_length=64)
 
 @app.post("/api/pedido/{mesa_id}")
 def crear_pedido(mesa_id: int, request: PedidoRequest, db: Session = Depends(get_db)):
     config = get_config()
     moneda = config.get("moneda", "$").split()[0]
     
+    if request.clave:
+        previo = _pedido_por_clave(db, request.clave)
+        if previo is not None:
+            return _respuesta_pedido(previo, moneda, duplicado=True)
+    
     mesa = db.query(Mesa).filter(Mesa.id == mesa_id, Mesa.activa == True).first()
     if not mesa:
         raise HTTPException(status_code=404, detail="Mesa no encontrada o inactiva")
@@ -385,20 +628,47 @@ def crear_pedido(mesa_id: int, request: PedidoRequest, db: Session = Depends(get
         raise HTTPException(status_code=400, detail="No se pudieron agregar productos al pedido")
     
     nuevo_pedido.total = total
-    db.commit()
+    if request.clave:
+        db.add(ClavePedido(clave=request.clave, pedido_id=nuevo_pedido.id))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otro worker aceptó el mismo reintento mientras tanto
+        db.rollback()
+        previo = _pedido_por_clave(db, request.clave) if request.clave else None
+        if previo is None:
+            raise
+        return _respuesta_pedido(previo, moneda, duplicado=True)
+    cola_cocina.sincronizar(db)
     
+    return _respuesta_pedido(nuevo_pedido, moneda)
+
+def _pedido_por_clave(db, clave):
+    return db.query(Pedido).join(ClavePedido, ClavePedido.pedido_id == Pedido.id).filter(ClavePedido.clave == clave).first()
+
+def _respuesta_pedido(pedido, moneda, duplicado=False):
     return {
         "success": True,
-        "pedido_id": nuevo_pedido.id,
-        "mesa": mesa.nombre,
-        "total": total,
+        "pedido_id": pedido.id,
+        "mesa": pedido.mesa.nombre,
+        "total": pedido.total,
         "moneda": moneda,
+        "duplicado": duplicado,
         "mensaje": "Pedido recibido correctamente"
     }
 
 @app.get("/api/pedidos/pendientes")
-def get_pedidos_pendientes(db: Session = Depends(get_db)):
+def get_pedidos_pendientes(
+    request: Request,
+    response: Response,
+    formato: Optional[str] = Query(None, description="json (por defecto), compacto o msgpack; también se negocia por Accept"),
+    db: Session = Depends(get_db)
+):
+    tipo = negociar(request, formato)
+    response.headers["Vary"] = "Accept"
     pedidos = db.query(Pedido).filter(Pedido.estado == 'pendiente').order_by(Pedido.fecha_hora.desc()).all()
+    if tipo != 'json':
+        return respuesta(*codificar(_pedidos_compactos(pedidos), tipo))
     return [{
         "id": p.id,
         "mesa_id": p.mesa_id,
@@ -409,6 +679,37 @@ def get_pedidos_pendientes(db: Session = Depends(get_db)):
         "items": [{"nombre": d.producto.nombre, "cantidad": d.cantidad} for d in p.detalles]
     } for p in pedidos]
 
+def _pedidos_compactos(pedidos):
+    """
+    Pedidos en columnas con los nombres de mesa y de producto una sola vez.
+    Los items de cada pedido van planos: [producto, cantidad, producto, cantidad, ...]
+    """
+    mesas = {p.mesa_id: p.mesa.nombre for p in pedidos}
+    productos, codigos = diccionario([d.producto.nombre for p in pedidos for d in p.detalles])
+    
+    items = []
+    posicion = 0
+    for p in pedidos:
+        planos = []
+        for d in p.detalles:
+            planos += [codigos[posicion], d.cantidad]
+            posicion += 1
+        items.append(planos)
+    
+    filas = [{
+        "id": p.id,
+        "mesa_id": p.mesa_id,
+        "total": p.total,
+        "hora": p.fecha_hora.strftime("%H:%M"),
+        "notas": p.notas
+    } for p in pedidos]
+    
+    return {
+        "mesas": {str(mesa_id): nombre for mesa_id, nombre in mesas.items()},
+        "productos": productos,
+        "pedidos": {**columnas(filas, ["id", "mesa_id", "total", "hora", "notas"]), "items": items}
+    }
+
 @app.post("/api/pedido/{pedido_id}/estado")
 def actualizar_estado(pedido_id: int, estado: str, db: Session = Depends(get_db)):
     if estado not in Pedido.ESTADOS:
@@ -420,11 +721,318 @@ def actualizar_estado(pedido_id: int, estado: str, db: Session = Depends(get_db)
     
     pedido.estado = estado
     db.commit()
+    cola_cocina.sincronizar(db)
     return {"success": True}
 
+class CambioEstadoMasivo(BaseModel):
+    estado: str
+    pedido_ids: List[int] = []
+    mesa_id: Optional[int] = None
+    desde: Optional[List[str]] = None
+
+@app.post("/api/pedidos/estado")
+def actualizar_estado_masivo(request: CambioEstadoMasivo, db: Session = Depends(get_db)):
+    """
+    Cambia el estado de varios pedidos en una sola transacción.
+    
+    Acepta una lista de `pedido_ids` y/o una `mesa_id`; para la mesa se toman
+    sus pedidos en los estados `desde` (por defecto, todos los que pueden pasar
+    a `estado`). Las transiciones no permitidas se informan por pedido y no
+    impiden aplicar las demás.
+    """
+    if request.estado not in Pedido.ESTADOS:
+        raise HTTPException(status_code=400, detail="Estado inválido")
+    if request.desde and any(e not in Pedido.ESTADOS for e in request.desde):
+        raise HTTPException(status_code=400, detail="Estado de origen inválido")
+    if not request.pedido_ids and request.mesa_id is None:
+        raise HTTPException(status_code=400, detail="Indique pedido_ids o mesa_id")
+    if request.mesa_id is not None and not db.query(Mesa.id).filter(Mesa.id == request.mesa_id).first():
+        raise HTTPException(status_code=404, detail="Mesa no encontrada")
+    
+    pedidos = {}
+    if request.pedido_ids:
+        for p in db.query(Pedido).filter(Pedido.id.in_(request.pedido_ids)):
+            pedidos[p.id] = p
+    if request.mesa_id is not None:
+        origenes = request.desde or [e for e, destinos in Pedido.TRANSICIONES.items() if request.estado in destinos]
+        for p in db.query(Pedido).filter(Pedido.mesa_id == request.mesa_id, Pedido.estado.in_(origenes)):
+            pedidos[p.id] = p
+    
+    resultados = []
+    for pedido_id in request.pedido_ids:
+        if pedido_id not in pedidos:
+            resultados.append({"id": pedido_id, "success": False, "error": "Pedido no encontrado"})
+    
+    actualizados = 0
+    for pedido in sorted(pedidos.values(), key=lambda p: p.id):
+        anterior = pedido.estado
+        if anterior == request.estado:
+            resultados.append({"id": pedido.id, "success": True, "estado_anterior": anterior})
+        elif pedido.puede_pasar_a(request.estado):
+            # Condicionado al estado leído: si otro cliente lo cambió entretanto
+            # no se pisa su transición
+            filas = db.query(Pedido).filter(Pedido.id == pedido.id, Pedido.estado == anterior).update(
+                {Pedido.estado: request.estado}, synchronize_session=False
+            )
+            if filas:
+                actualizados += 1
+                resultados.append({"id": pedido.id, "success": True, "estado_anterior": anterior})
+            else:
+                resultados.append({
+                    "id": pedido.id,
+                    "success": False,
+                    "estado_anterior": anterior,
+                    "error": "Conflicto: el pedido cambió de estado durante la operación"
+                })
+        else:
+            resultados.append({
+                "id": pedido.id,
+                "success": False,
+                "estado_anterior": anterior,
+                "error": f"Transición no permitida: {anterior} → {request.estado}"
+            })
+    
+    db.commit()
+    cola_cocina.sincronizar(db)
+    
+    return {
+        "success": all(r["success"] for r in resultados),
+        "actualizados": actualizados,
+        "resultados": resultados
+    }
+
+# ===== COLA DE COCINA =====
+cola_cocina = ColaCocina()
+
+@app.get("/api/cocina")
+def obtener_cola_cocina(db: Session = Depends(get_db)):
+    """Cantidades por preparar de cada producto y antigüedad del ticket más viejo"""
+    cola_cocina.sincronizar(db)
+    return cola_cocina.resumen()
+
+# ===== CUENTAS DE MESA =====
+def _cuenta_json(sesion, mesa, moneda):
+    return {
+        "mesa_id": mesa.id,
+        "mesa": mesa.nombre,
+        "abierta": sesion is not None,
+        "sesion_id": sesion.id if sesion else None,
+        "abierta_en": sesion.abierta_en.isoformat(timespec="minutes") if sesion else None,
+        "ultimo_movimiento": sesion.ultimo_movimiento.isoformat(timespec="minutes") if sesion else None,
+        "total": round(sesion.total, 2) if sesion else 0,
+        "pedidos": sesion.pedidos if sesion else 0,
+        "pedidos_abiertos": sesion.pedidos_abiertos if sesion else 0,
+        "moneda": moneda
+    }
+
+@app.get("/api/mesa/{mesa_id}/cuenta")
+def obtener_cuenta_mesa(
+    mesa_id: int,
+    detalle: bool = Query(False, description="Incluir los pedidos de la cuenta"),
+    db: Session = Depends(get_db)
+):
+    """Cuenta abierta de la mesa; los totales ya vienen calculados por los triggers"""
+    mesa = db.query(Mesa).filter(Mesa.id == mesa_id).first()
+    if not mesa:
+        raise HTTPException(status_code=404, detail="Mesa no encontrada")
+    
+    sesion = SesionMesa.abierta(db, mesa_id)
+    cuenta = _cuenta_json(sesion, mesa, _get_moneda())
+    if detalle and sesion:
+        pedidos = db.query(Pedido).join(PedidoSesion, PedidoSesion.pedido_id == Pedido.id).filter(
+            PedidoSesion.sesion_id == sesion.id
+        ).order_by(Pedido.fecha_hora).all()
+        cuenta["detalle"] = [{
+            "id": p.id,
+            "hora": p.fecha_hora.strftime("%H:%M"),
+            "estado": p.estado,
+            "total": p.total,
+            "items": [{"nombre": d.producto.nombre, "cantidad": d.cantidad, "subtotal": d.subtotal()} for d in p.detalles]
+        } for p in pedidos]
+    return cuenta
+
+@app.get("/api/mesas/cuentas")
+def obtener_cuentas_abiertas(db: Session = Depends(get_db)):
+    """Cuentas abiertas de todas las mesas, para la vista de sala"""
+    moneda = _get_moneda()
+    sesiones = db.query(SesionMesa, Mesa).join(Mesa, Mesa.id == SesionMesa.mesa_id).filter(
+        SesionMesa.vigente()
+    ).order_by(Mesa.numero).all()
+    cuentas = [_cuenta_json(sesion, mesa, moneda) for sesion, mesa in sesiones]
+    return {
+        "cuentas": cuentas,
+        "total": round(sum(c["total"] for c in cuentas), 2),
+        "moneda": moneda
+    }
+
+@app.post("/api/mesa/{mesa_id}/cuenta/cerrar")
+def cerrar_cuenta_mesa(
+    mesa_id: int,
+    forzar: bool = Query(False, description="Cerrar aunque queden pedidos sin entregar"),
+    db: Session = Depends(get_db)
+):
+    """Cierra la cuenta (la mesa pagó); el próximo pedido de la mesa abre una nueva"""
+    mesa = db.query(Mesa).filter(Mesa.id == mesa_id).first()
+    if not mesa:
+        raise HTTPException(status_code=404, detail="Mesa no encontrada")
+    
+    sesion = SesionMesa.abierta(db, mesa_id)
+    if sesion is None:
+        raise HTTPException(status_code=404, detail="La mesa no tiene una cuenta abierta")
+    if sesion.pedidos_abiertos and not forzar:
+        raise HTTPException(
+            status_code=409,
+            detail=f"La mesa tiene {sesion.pedidos_abiertos} pedido(s) sin entregar; use forzar=true para cerrar igual"
+        )
+    
+    cuenta = _cuenta_json(sesion, mesa, _get_moneda())
+    sesion.cerrada_en = datetime.now()
+    db.commit()
+    
+    cuenta["abierta"] = False
+    cuenta["cerrada_en"] = sesion.cerrada_en.isoformat(timespec="minutes")
+    return {"success": True, "cuenta": cuenta}
+
+# ===== EVENTOS DE PEDIDOS (SSE) =====
+INTERVALO_EVENTOS = 1.0
+
+def _leer_eventos_pedidos(desde):
+    """Pedidos creados o modificados después de la versión `desde`, por cualquier proceso"""
+    db = SessionLocal()
+    try:
+        cambios = db.query(Cambio).filter(
+            Cambio.tabla == 'pedidos',
+            Cambio.version > desde
+        ).order_by(Cambio.version).limit(500).all()
+        if not cambios:
+            return [], desde
+        
+        por_pedido = {}
+        for c in cambios:
+            previo = por_pedido.pop(c.registro_id, None)
+            alta = c.operacion == 'I' or (previo is not None and previo['operacion'] == 'I')
+            por_pedido[c.registro_id] = {"version": c.version, "operacion": 'I' if alta else c.operacion}
+        
+        pedidos = {p.id: p for p in db.query(Pedido).filter(Pedido.id.in_(por_pedido)).all()}
+        eventos = []
+        for pedido_id, cambio in por_pedido.items():
+            p = pedidos.get(pedido_id)
+            if p is None:
+                eventos.append({**cambio, "id": pedido_id, "operacion": 'D'})
+                continue
+            eventos.append({
+                **cambio,
+                "id": p.id,
+                "mesa_id": p.mesa_id,
+                "mesa_nombre": p.mesa.nombre if p.mesa else None,
+                "estado": p.estado,
+                "total": p.total,
+                "hora": p.fecha_hora.strftime("%H:%M")
+            })
+        return eventos, cambios[-1].version
+    finally:
+        db.close()
+
+def _version_pedidos():
+    db = SessionLocal()
+    try:
+        return Cambio.version_actual(db, 'pedidos')
+    finally:
+        db.close()
+
+@app.get("/api/pedidos/eventos")
+async def eventos_pedidos(request: Request, desde: Optional[int] = Query(None, description="Versión desde la que reenviar eventos")):
+    """
+    Stream SSE de altas y cambios de estado de pedidos.
+    
+    Los eventos se leen de la tabla `cambios` compartida, así que cada monitor
+    recibe todos los pedidos sin importar qué worker los aceptó.
+    """
+    ultimo_id = request.headers.get("last-event-id")
+    if ultimo_id and ultimo_id.isdigit():
+        desde = int(ultimo_id)
+    if desde is None:
+        desde = await run_in_threadpool(_version_pedidos)
+    
+    async def stream():
+        version = desde
+        silencio = 0
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            eventos, version = await run_in_threadpool(_leer_eventos_pedidos, version)
+            for ev in eventos:
+                yield f"id: {ev['version']}\nevent: pedido\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+            silencio = 0 if eventos else silencio + 1
+            if silencio >= 15:
+                # Comentario keep-alive para proxies y navegadores
+                yield ": ping\n\n"
+                silencio = 0
+            await asyncio.sleep(INTERVALO_EVENTOS)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/api/version")
-def get_version():
-    return {"version": str(int(time.time()))}
+def get_version(db: Session = Depends(get_db)):
+    """Versión del menú: cambia solo cuando se modifica algún producto"""
+    return {"version": str(Cambio.version_actual(db, 'productos'))}
+
+# ===== PERFILADO (opcional) =====
+ENV_PERFIL = "BOMAPETTITE_PERFIL"
+perfilador = None
+
+def _get_perfilador():
+    if perfilador is None:
+        raise HTTPException(status_code=404, detail="Perfilado no activo")
+    return perfilador
+
+@app.get("/api/admin/perfil")
+def obtener_perfil():
+    """Muestras acumuladas por ruta"""
+    return _get_perfilador().resumen()
+
+@app.post("/api/admin/perfil/volcar")
+def volcar_perfil(reiniciar: bool = Query(False, description="Vaciar muestras tras volcar")):
+    """Escribe los perfiles en formato speedscope y collapsed-stack"""
+    archivos = _get_perfilador().volcar(Settings.BASE_DIR / "exports" / "perfiles", reiniciar=reiniciar)
+    return {"archivos": archivos}
+
+@app.get("/api/admin/consultas-lentas")
+def obtener_consultas_lentas():
+    """Consultas SQL que superaron el umbral, con la ruta que las emitió"""
+    return list(_get_perfilador().consultas_lentas)
+
+def activar_perfilado(fraccion=0.1, umbral_sql_ms=100):
+    global perfilador
+    if perfilador is None:
+        perfilador = Perfilador(fraccion=fraccion, umbral_sql_ms=umbral_sql_ms)
+        perfilador.instalar(app, engine)
+    return perfilador
+
+def iniciar_servidor(host="0.0.0.0", port=8000, perfilado=False, fraccion_perfil=0.1, umbral_sql_ms=100, workers=1):
+    """
+    Inicia el servidor HTTP
+    
+    perfilado: muestrea `fraccion_perfil` de las peticiones y registra
+    las consultas SQL que tarden más de `umbral_sql_ms`
+    workers: procesos uvicorn; con más de uno las caches se invalidan
+    vía la tabla `cambios` y los eventos SSE llegan desde cualquier worker
+    """
+    import uvicorn
+    
+    if workers > 1:
+        # Los workers arrancan a la vez y competirían por crear el esquema:
+        # se prepara una vez aquí y su lifespan lo encuentra al día
+        preparar_esquema(engine)
+        if perfilado:
+            # Cada worker importa este módulo de nuevo: la opción viaja por entorno
+            os.environ[ENV_PERFIL] = f"{fraccion_perfil},{umbral_sql_ms}"
+        uvicorn.run("core.server.app:app", host=host, port=port, workers=workers, log_level="warning")
+        return
+    
+    if perfilado:
+        activar_perfilado(fraccion_perfil, umbral_sql_ms)
+    uvicorn.run(app, host=host, port=port, log_level="warning")
 
-def iniciar_servidor(host="0.0.0.0", port=8000):
-    uvicorn.run(app, host=host, port=port, log_level="warning")
\ No newline at end of file
+if os.environ.get(ENV_PERFIL):
+    _fraccion, _umbral = os.environ[ENV_PERFIL].split(",")
+    activar_perfilado(float(_fraccion), float(_umbral))
\ No newline at end of file
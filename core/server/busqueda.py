@@ -0,0 +1,68 @@
+# core/server/busqueda.py
+import re
+import unicodedata
+
+from sqlalchemy import text, or_
+from sqlalchemy.exc import OperationalError
+
+from core.models.models import Producto
+
+# Peso de cada columna en el ranking bm25: nombre > categoría > descripción
+PESOS = (10.0, 2.0, 5.0)
+LIMITE = 200
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos: 'Café' -> 'cafe'"""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def consulta_fts(texto):
+    """Convierte la entrada del usuario en una consulta FTS5 de prefijos: 'caf con' -> '"caf"* "con"*'"""
+    terminos = re.findall(r'\w+', normalizar(texto))
+    return ' '.join(f'"{t}"*' for t in terminos)
+
+
+def buscar_productos(db, texto, categoria=None):
+    """
+    IDs de productos disponibles (de `categoria`, si se indica) que coinciden
+    con `texto`, del más al menos relevante.
+
+    Retorna None si no hay índice FTS5 disponible; el llamador debe
+    recurrir a `filtro_like`.
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+
+    # Los filtros van antes del LIMIT para no perder productos válidos
+    # detrás de coincidencias no disponibles o de otra categoría
+    parametros = {"consulta": consulta, "limite": LIMITE}
+    filtro_categoria = ""
+    if categoria:
+        filtro_categoria = "AND productos.categoria = :categoria"
+        parametros["categoria"] = categoria
+
+    try:
+        filas = db.execute(text(f"""
+            SELECT productos_fts.rowid FROM productos_fts
+            JOIN productos ON productos.id = productos_fts.rowid
+            WHERE productos_fts MATCH :consulta
+              AND productos.disponible = 1 {filtro_categoria}
+            ORDER BY bm25(productos_fts, {', '.join(map(str, PESOS))})
+            LIMIT :limite
+        """), parametros).all()
+    except OperationalError:
+        return None
+    return [f[0] for f in filas]
+
+
+def filtro_like(texto):
+    """Búsqueda sin índice: subcadena en nombre, descripción o categoría"""
+    patron = f"%{texto.lower()}%"
+    return or_(
+        Producto.nombre.ilike(patron),
+        Producto.descripcion.ilike(patron),
+        Producto.categoria.ilike(patron)
+    )
@@ -0,0 +1,51 @@
+# core/server/cache.py
+import threading
+from pathlib import Path
+
+
+class CacheVersionada:
+    """
+    Cache por proceso invalidada por un sello compartido.
+
+    El sello debe poder leerse barato desde cualquier worker (versión en la
+    tabla `cambios`, mtime de un archivo...): cuando cambia, se descarta
+    todo lo cacheado, así cada proceso se entera de los cambios hechos por
+    los demás sin canal de comunicación propio.
+    """
+
+    def __init__(self, maximo=64):
+        self.maximo = maximo
+        self._sello = None
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, sello, clave, fabrica):
+        with self._lock:
+            if sello != self._sello:
+                self._datos = {}
+                self._sello = sello
+            elif clave in self._datos:
+                return self._datos[clave]
+
+        valor = fabrica()
+
+        with self._lock:
+            if sello == self._sello:
+                if len(self._datos) >= self.maximo:
+                    self._datos = {}
+                self._datos[clave] = valor
+        return valor
+
+    def invalidar(self):
+        with self._lock:
+            self._datos = {}
+            self._sello = None
+
+
+def sello_archivo(ruta):
+    """mtime y tamaño del archivo, o None si no existe"""
+    try:
+        stat = Path(ruta).stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,130 @@
+# core/server/cocina.py
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from core.models.models import Pedido, DetallePedido, Cambio
+
+
+class ColaCocina:
+    """
+    Cantidades por preparar de cada producto, mantenidas en memoria.
+
+    Se actualiza leyendo solo los pedidos que aparecen en `cambios` desde la
+    última versión aplicada, así que el costo es proporcional a los cambios y
+    no a los pedidos abiertos; cada worker converge aunque el pedido lo haya
+    recibido otro proceso.
+    """
+
+    ABIERTOS = ('pendiente', 'preparando')
+
+    def __init__(self):
+        self.version = None
+        self._pedidos = {}      # pedido_id -> {"estado", "fecha", "items": {producto_id: cantidad}}
+        self._productos = {}    # producto_id -> {"nombre", "categoria", "pendiente", "preparando", "tickets": {pedido_id: fecha}}
+        self._lock = threading.Lock()
+
+    def sincronizar(self, db):
+        """Aplica los cambios de pedidos posteriores a la última versión vista"""
+        with self._lock:
+            # Sin versión, o si la purga de `cambios` dejó un hueco desde la
+            # última aplicada, se recarga completa
+            if self.version is None or self._historial_incompleto(db):
+                self._cargar(db)
+                return
+
+            cambios = db.query(Cambio.version, Cambio.registro_id).filter(
+                Cambio.tabla == 'pedidos',
+                Cambio.version > self.version
+            ).order_by(Cambio.version).all()
+            if not cambios:
+                return
+
+            ids = {registro_id for _, registro_id in cambios}
+            actuales = {p.id: p for p in self._consultar(db).filter(Pedido.id.in_(ids))}
+            for pedido_id in ids:
+                self._quitar(pedido_id)
+                pedido = actuales.get(pedido_id)
+                if pedido is not None and pedido.estado in self.ABIERTOS:
+                    self._agregar(pedido)
+            self.version = cambios[-1].version
+
+    def _historial_incompleto(self, db):
+        minima = db.query(func.min(Cambio.version)).filter(Cambio.tabla == 'pedidos').scalar()
+        return minima is not None and minima > self.version
+
+    def _cargar(self, db):
+        """Carga inicial de los pedidos abiertos (una sola vez por proceso)"""
+        self.version = Cambio.version_actual(db, 'pedidos')
+        self._pedidos.clear()
+        self._productos.clear()
+        pedidos = self._consultar(db).filter(Pedido.estado.in_(self.ABIERTOS)).order_by(Pedido.fecha_hora)
+        for pedido in pedidos:
+            self._agregar(pedido)
+
+    def _consultar(self, db):
+        return db.query(Pedido).options(
+            selectinload(Pedido.detalles).selectinload(DetallePedido.producto)
+        )
+
+    def _agregar(self, pedido):
+        items = {}
+        for detalle in pedido.detalles:
+            items[detalle.producto_id] = items.get(detalle.producto_id, 0) + detalle.cantidad
+            if detalle.producto_id not in self._productos:
+                self._productos[detalle.producto_id] = {
+                    "nombre": detalle.producto.nombre if detalle.producto else f"#{detalle.producto_id}",
+                    "categoria": (detalle.producto.categoria if detalle.producto else None) or "General",
+                    "pendiente": 0,
+                    "preparando": 0,
+                    "tickets": {}
+                }
+        self._pedidos[pedido.id] = {"estado": pedido.estado, "fecha": pedido.fecha_hora, "items": items}
+
+        for producto_id, cantidad in items.items():
+            producto = self._productos[producto_id]
+            producto[pedido.estado] += cantidad
+            producto["tickets"][pedido.id] = pedido.fecha_hora
+
+    def _quitar(self, pedido_id):
+        previo = self._pedidos.pop(pedido_id, None)
+        if previo is None:
+            return
+
+        for producto_id, cantidad in previo["items"].items():
+            producto = self._productos[producto_id]
+            producto[previo["estado"]] -= cantidad
+            producto["tickets"].pop(pedido_id, None)
+            if not producto["tickets"]:
+                del self._productos[producto_id]
+
+    def resumen(self):
+        """Cola por producto (el ticket más antiguo primero) y totales por categoría"""
+        ahora = datetime.now()
+        with self._lock:
+            productos = []
+            categorias = {}
+            for producto_id, p in self._productos.items():
+                mas_antiguo = min(p["tickets"].values())
+                productos.append({
+                    "producto_id": producto_id,
+                    "nombre": p["nombre"],
+                    "categoria": p["categoria"],
+                    "pendiente": p["pendiente"],
+                    "preparando": p["preparando"],
+                    "tickets": len(p["tickets"]),
+                    "espera_min": int((ahora - mas_antiguo).total_seconds() // 60)
+                })
+                cat = categorias.setdefault(p["categoria"], {"pendiente": 0, "preparando": 0})
+                cat["pendiente"] += p["pendiente"]
+                cat["preparando"] += p["preparando"]
+
+            productos.sort(key=lambda p: -p["espera_min"])
+            return {
+                "version": self.version,
+                "pedidos_abiertos": len(self._pedidos),
+                "productos": productos,
+                "categorias": categorias
+            }
@@ -0,0 +1,57 @@
+# core/server/formato.py
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+# Tipos aceptados en `Accept` para pedir la representación compacta
+TIPO_COMPACTO = "application/vnd.bomapettite.compacto+json"
+TIPOS_MSGPACK = ("application/msgpack", "application/x-msgpack")
+
+FORMATOS = ('json', 'compacto', 'msgpack')
+
+
+def negociar(request, formato=None):
+    """
+    Formato de respuesta pedido por el cliente: 'json' (por defecto),
+    'compacto' o 'msgpack'. `?formato=` tiene prioridad sobre `Accept`.
+    """
+    if formato:
+        if formato not in FORMATOS:
+            raise HTTPException(status_code=400, detail=f"Formato inválido; use uno de: {', '.join(FORMATOS)}")
+        return formato
+
+    accept = request.headers.get("accept", "")
+    if any(tipo in accept for tipo in TIPOS_MSGPACK):
+        return 'msgpack'
+    if TIPO_COMPACTO in accept:
+        return 'compacto'
+    return 'json'
+
+
+def codificar(datos, formato):
+    """Serializa una estructura compacta; retorna (bytes, media_type)"""
+    if formato == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            raise HTTPException(status_code=406, detail="MessagePack no disponible en el servidor (pip install msgpack)")
+        return msgpack.packb(datos, use_bin_type=True), TIPOS_MSGPACK[0]
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), TIPO_COMPACTO
+
+
+def respuesta(cuerpo, media_type):
+    return Response(content=cuerpo, media_type=media_type, headers={"Vary": "Accept"})
+
+
+# ===== COLUMNAS =====
+def columnas(filas, campos):
+    """[{'a': 1, 'b': 2}, ...] -> {'a': [1, ...], 'b': [2, ...]}"""
+    return {campo: [fila[campo] for fila in filas] for campo in campos}
+
+
+def diccionario(valores):
+    """Valores repetidos a índices: ['x', 'y', 'x'] -> (['x', 'y'], [0, 1, 0])"""
+    indices = {}
+    codigos = [indices.setdefault(v, len(indices)) for v in valores]
+    return list(indices), codigos
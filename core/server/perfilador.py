@@ -0,0 +1,215 @@
+# core/server/perfilador.py
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import functools
+import threading
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+
+class Perfilador:
+    """Perfilador por muestreo de pilas, agregado por ruta, con log de consultas lentas"""
+
+    def __init__(self, fraccion=0.1, intervalo=0.005, umbral_sql_ms=100, max_consultas=500):
+        self.fraccion = fraccion
+        self.intervalo = intervalo
+        self.umbral_sql = umbral_sql_ms / 1000
+        self.pilas = defaultdict(Counter)   # ruta -> {(frame_raiz, ..., frame_hoja): muestras}
+        self.consultas_lentas = deque(maxlen=max_consultas)
+        self._rutas = {}                    # code object del endpoint -> "GET /api/menu"
+        self._activas = {}                  # ident del hilo o tarea asyncio -> (loop o None, ident del hilo)
+        self._lock = threading.Lock()
+        self._hay_activas = threading.Event()
+        self._hilo = None
+
+    def instalar(self, app, engine):
+        """Envuelve los endpoints, registra listeners SQL y arranca el hilo de muestreo"""
+        for ruta in app.routes:
+            if isinstance(ruta, APIRoute):
+                self._rutas[ruta.endpoint.__code__] = f"{','.join(sorted(ruta.methods))} {ruta.path}"
+                # FastAPI invoca dependant.call en cada petición
+                ruta.dependant.call = self._envolver(ruta.dependant.call)
+        event.listen(engine, "before_cursor_execute", self._antes_sql)
+        event.listen(engine, "after_cursor_execute", self._despues_sql)
+
+        self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+        self._hilo.start()
+
+    # ===== CONTROL DE PETICIONES MUESTREADAS =====
+    def debe_muestrear(self):
+        return random.random() < self.fraccion
+
+    def _envolver(self, endpoint):
+        """
+        Decide el muestreo al entrar al endpoint y registra quién lo ejecuta:
+        el hilo del threadpool (def) o la tarea del event loop (async def),
+        para no muestrear peticiones ajenas que corran a la vez.
+        """
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def envoltorio(*args, **kwargs):
+                if not self.debe_muestrear():
+                    return await endpoint(*args, **kwargs)
+                tarea = asyncio.current_task()
+                self._entrar(tarea, asyncio.get_running_loop())
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    self._salir(tarea)
+        else:
+            @functools.wraps(endpoint)
+            def envoltorio(*args, **kwargs):
+                if not self.debe_muestrear():
+                    return endpoint(*args, **kwargs)
+                ident = threading.get_ident()
+                self._entrar(ident, None)
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    self._salir(ident)
+        return envoltorio
+
+    def _entrar(self, clave, loop):
+        with self._lock:
+            self._activas[clave] = (loop, threading.get_ident())
+            self._hay_activas.set()
+
+    def _salir(self, clave):
+        with self._lock:
+            self._activas.pop(clave, None)
+            if not self._activas:
+                self._hay_activas.clear()
+
+    # ===== MUESTREO DE PILAS =====
+    def _muestrear(self):
+        while True:
+            self._hay_activas.wait()
+            with self._lock:
+                activas = list(self._activas.items())
+
+            # Una tarea async solo cuenta si es la que corre ahora en su loop
+            hilos = {
+                ident for clave, (loop, ident) in activas
+                if loop is None or asyncio.current_task(loop) is clave
+            }
+            frames = sys._current_frames()
+            for ident in hilos:
+                if ident in frames:
+                    self._registrar_pila(frames[ident])
+            time.sleep(self.intervalo)
+
+    def _registrar_pila(self, frame):
+        """Acumula la pila desde el endpoint hasta la hoja; ignora hilos fuera de una ruta"""
+        pila = []
+        while frame is not None:
+            codigo = frame.f_code
+            pila.append(f"{codigo.co_name} ({Path(codigo.co_filename).name}:{codigo.co_firstlineno})")
+            ruta = self._rutas.get(codigo)
+            if ruta is not None:
+                pila.reverse()
+                self.pilas[ruta][tuple(pila)] += 1
+                return
+            frame = frame.f_back
+
+    def _ruta_actual(self):
+        frame = sys._getframe(2)
+        while frame is not None:
+            ruta = self._rutas.get(frame.f_code)
+            if ruta is not None:
+                return ruta
+            frame = frame.f_back
+        return "-"
+
+    # ===== CONSULTAS LENTAS =====
+    def _antes_sql(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perfil_inicio", []).append(time.perf_counter())
+
+    def _despues_sql(self, conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - conn.info["perfil_inicio"].pop()
+        if duracion >= self.umbral_sql:
+            self.consultas_lentas.append({
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "ruta": self._ruta_actual(),
+                "ms": round(duracion * 1000, 2),
+                "sql": statement
+            })
+
+    # ===== EXPORTACIÓN =====
+    def resumen(self):
+        return {
+            "fraccion": self.fraccion,
+            "intervalo_ms": self.intervalo * 1000,
+            "umbral_sql_ms": self.umbral_sql * 1000,
+            "rutas": {ruta: sum(pilas.values()) for ruta, pilas in list(self.pilas.items())}
+        }
+
+    def a_collapsed(self):
+        """Formato collapsed-stack (flamegraph.pl, speedscope); la ruta es el frame raíz"""
+        lineas = []
+        for ruta, pilas in list(self.pilas.items()):
+            for pila, muestras in list(pilas.items()):
+                lineas.append(f"{';'.join((ruta,) + pila)} {muestras}")
+        return "\n".join(lineas) + "\n"
+
+    def a_speedscope(self):
+        """Formato speedscope con un perfil por ruta"""
+        frames = []
+        indices = {}
+        perfiles = []
+
+        for ruta, pilas in list(self.pilas.items()):
+            muestras = []
+            pesos = []
+            for pila, cuenta in list(pilas.items()):
+                fila = []
+                for nombre in pila:
+                    if nombre not in indices:
+                        indices[nombre] = len(frames)
+                        frames.append({"name": nombre})
+                    fila.append(indices[nombre])
+                muestras.append(fila)
+                pesos.append(cuenta * self.intervalo)
+
+            perfiles.append({
+                "type": "sampled",
+                "name": ruta,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(pesos),
+                "samples": muestras,
+                "weights": pesos
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "BomApettite",
+            "exporter": "bomapettite-perfilador",
+            "shared": {"frames": frames},
+            "profiles": perfiles
+        }
+
+    def volcar(self, directorio, reiniciar=False):
+        """Escribe los perfiles acumulados a disco y retorna las rutas generadas"""
+        directorio = Path(directorio)
+        directorio.mkdir(parents=True, exist_ok=True)
+        # Con varios workers cada proceso vuelca sus propias muestras
+        base = f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+        ruta_collapsed = directorio / f"{base}.collapsed.txt"
+        ruta_speedscope = directorio / f"{base}.speedscope.json"
+        ruta_collapsed.write_text(self.a_collapsed(), encoding="utf-8")
+        ruta_speedscope.write_text(json.dumps(self.a_speedscope()), encoding="utf-8")
+
+        if reiniciar:
+            self.pilas.clear()
+
+        return [str(ruta_collapsed), str(ruta_speedscope)]
+
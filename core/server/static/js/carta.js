@@ -3,6 +3,10 @@
  * Sistema táctil robusto con delegación de eventos
  */
 
+// Claves de localStorage
+const CLAVE_COLA = 'bomapettite.pedidosPendientes';
+const CLAVE_MENU = 'bomapettite.menu';
+
 class CartaApp {
     constructor() {
         this.mesaId = null;
@@ -11,6 +15,9 @@ class CartaApp {
         this.categorias = [];
         this.categoriaActiva = 'Todas';
         this.terminoBusqueda = '';
+        this.versionMenu = null;
+        this.timerSincronizacion = null;
+        this.reenviando = false;
         
         // Referencias DOM cacheadas
         this.refs = {};
@@ -42,6 +49,19 @@ class CartaApp {
         
         // Cargar datos
         this.cargarMenu();
+        
+        // Modo offline: shell y menú en caché, pedidos encolados sin conexión
+        this.registrarServiceWorker();
+        window.addEventListener('online', () => this.reenviarCola());
+        this.reenviarCola();
+    }
+
+    registrarServiceWorker() {
+        // Los service workers solo existen en contextos seguros (HTTPS o localhost)
+        if (!('serviceWorker' in navigator) || !window.isSecureContext) return;
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.warn('Service worker no registrado:', error);
+        });
     }
 
     cachearReferencias() {
@@ -227,15 +247,16 @@ class CartaApp {
         try {
             this.mostrarCargando();
             
-            const response = await fetch('/api/menu');
-            if (!response.ok) throw new Error('Error al cargar menú');
-            
-            const data = await response.json();
+            const data = this.expandirMenu(await this.obtenerMenuCompacto());
             this.menuCompleto = data.menu;
             this.categorias = data.categorias;
+            this.versionMenu = data.version;
             
             this.generarFiltros();
             this.renderizarMenu();
+            this.iniciarSincronizacion();
+            // El menú pudo venir de caché: se pone al día de inmediato
+            this.sincronizarMenu();
             
         } catch (error) {
             console.error('Error:', error);
@@ -243,6 +264,121 @@ class CartaApp {
         }
     }
 
+    // Última copia recibida como respaldo si la red falla (también sin service worker)
+    async obtenerMenuCompacto() {
+        try {
+            const response = await fetch('/api/menu?formato=compacto');
+            if (!response.ok) throw new Error('Error al cargar menú');
+            const data = await response.json();
+            try {
+                localStorage.setItem(CLAVE_MENU, JSON.stringify(data));
+            } catch (error) {
+                // Almacenamiento lleno o bloqueado: solo se pierde el respaldo
+            }
+            return data;
+        } catch (error) {
+            const copia = localStorage.getItem(CLAVE_MENU);
+            if (!copia) throw error;
+            return JSON.parse(copia);
+        }
+    }
+
+    // Convierte el menú en columnas (?formato=compacto) al formato agrupado por categoría
+    expandirMenu({version, moneda, categorias, imagenes, productos: col}) {
+        const menu = {};
+        col.id.forEach((id, i) => {
+            const categoria = categorias[col.categoria[i]];
+            const imagen = col.imagen[i];
+            const v = col.imagen_v[i];
+            
+            (menu[categoria] = menu[categoria] || []).push({
+                id,
+                nombre: col.nombre[i],
+                descripcion: col.descripcion[i],
+                precio: col.precio[i],
+                moneda,
+                categoria,
+                imagen: imagen ? `${imagenes.original}${imagen}` : null,
+                imagen_mini: imagen ? `${imagenes.miniaturas}mini/${imagen}.jpg?v=${v}` : null,
+                imagen_srcset: imagen
+                    ? Object.entries(imagenes.anchos)
+                        .map(([tamano, ancho]) => `${imagenes.miniaturas}${tamano}/${imagen}.webp?v=${v} ${ancho}w`)
+                        .join(', ')
+                    : null
+            });
+        });
+        
+        return {version, menu, categorias: Object.keys(menu).sort()};
+    }
+
+    // Mantiene la carta al día pidiendo solo los productos que cambiaron
+    iniciarSincronizacion() {
+        if (this.timerSincronizacion) return;
+        
+        this.timerSincronizacion = setInterval(() => {
+            this.sincronizarMenu();
+            this.reenviarCola();
+        }, 30000);
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) this.sincronizarMenu();
+        });
+    }
+
+    async sincronizarMenu() {
+        if (this.versionMenu === null || document.hidden) return;
+        
+        try {
+            const response = await fetch(`/api/menu/changes?since=${this.versionMenu}`);
+            if (!response.ok) return;
+            
+            const data = await response.json();
+            if (data.completo) {
+                const completo = this.expandirMenu(await this.obtenerMenuCompacto());
+                this.menuCompleto = completo.menu;
+                this.versionMenu = completo.version;
+            } else if (data.version !== this.versionMenu) {
+                this.aplicarCambiosMenu(data);
+                this.versionMenu = data.version;
+            } else {
+                return;
+            }
+            
+            const categorias = Object.keys(this.menuCompleto).sort();
+            if (categorias.join('|') !== this.categorias.join('|')) {
+                this.categorias = categorias;
+                if (!categorias.includes(this.categoriaActiva)) this.categoriaActiva = 'Todas';
+                this.generarFiltros();
+                this.filtrarPorCategoria(this.categoriaActiva);
+            } else {
+                this.actualizarVista();
+            }
+        } catch (error) {
+            // Sin conexión: se reintenta en el próximo ciclo
+        }
+    }
+
+    aplicarCambiosMenu({agregados, actualizados, eliminados}) {
+        const nuevos = [...agregados, ...actualizados];
+        const quitar = new Set([...eliminados, ...nuevos.map(p => p.id)]);
+        
+        Object.keys(this.menuCompleto).forEach(categoria => {
+            this.menuCompleto[categoria] = this.menuCompleto[categoria].filter(p => !quitar.has(p.id));
+        });
+        
+        nuevos.forEach(producto => {
+            const categoria = producto.categoria || 'General';
+            (this.menuCompleto[categoria] = this.menuCompleto[categoria] || []).push(producto);
+        });
+        
+        const ordenado = {};
+        Object.keys(this.menuCompleto).sort().forEach(categoria => {
+            const productos = this.menuCompleto[categoria];
+            if (productos.length === 0) return;
+            ordenado[categoria] = productos.sort((a, b) => a.nombre.localeCompare(b.nombre));
+        });
+        this.menuCompleto = ordenado;
+    }
+
     mostrarCargando() {
         if (this.refs.menuContainer) {
             this.refs.menuContainer.innerHTML = `
@@ -323,12 +459,7 @@ class CartaApp {
         
         return `
             <div class="producto" style="animation-delay: ${(catIndex * 0.1) + (prodIndex * 0.05)}s">
-                ${producto.imagen ? `
-                    <img src="${producto.imagen}" 
-                         class="producto-imagen" 
-                         alt="${producto.nombre}" 
-                         loading="lazy">
-                ` : ''}
+                ${producto.imagen ? this.crearImagenHTML(producto) : ''}
                 <div class="producto-info">
                     <h3>${producto.nombre}</h3>
                     ${producto.descripcion ? `
@@ -350,6 +481,31 @@ class CartaApp {
         `;
     }
 
+    crearImagenHTML(producto) {
+        // Variantes redimensionadas: el navegador elige el ancho según la pantalla
+        if (!producto.imagen_mini) {
+            return `
+                <img src="${producto.imagen}"
+                     class="producto-imagen"
+                     alt="${producto.nombre}"
+                     loading="lazy">
+            `;
+        }
+
+        return `
+            <picture>
+                <source type="image/webp"
+                        srcset="${producto.imagen_srcset}"
+                        sizes="(min-width: 500px) 500px, 100vw">
+                <img src="${producto.imagen_mini}"
+                     class="producto-imagen"
+                     alt="${producto.nombre}"
+                     loading="lazy"
+                     decoding="async">
+            </picture>
+        `;
+    }
+
     renderizarProductosFiltrados(menu) {
         if (!this.refs.menuContainer) return;
         
@@ -413,6 +569,11 @@ class CartaApp {
         }
     }
 
+    // Minúsculas y sin acentos, igual que el índice de búsqueda del servidor
+    normalizar(texto) {
+        return texto.normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase();
+    }
+
     actualizarVista() {
         let productosFiltrados = {};
         let totalProductos = 0;
@@ -422,11 +583,12 @@ class CartaApp {
                 return;
             }
             
+            const termino = this.normalizar(this.terminoBusqueda);
             const filtrados = productos.filter(p => {
-                if (!this.terminoBusqueda) return true;
-                const termino = this.terminoBusqueda.toLowerCase();
-                return p.nombre.toLowerCase().includes(termino) ||
-                       (p.descripcion && p.descripcion.toLowerCase().includes(termino));
+                if (!termino) return true;
+                return this.normalizar(p.nombre).includes(termino) ||
+                       (p.descripcion && this.normalizar(p.descripcion).includes(termino)) ||
+                       this.normalizar(categoria).includes(termino);
             });
             
             if (filtrados.length > 0) {
@@ -592,25 +754,29 @@ class CartaApp {
         }
 
         try {
-            const response = await fetch(`/api/pedido/${this.mesaId}`, {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({
-                    items: this.carrito.map(({id, cantidad}) => ({producto_id: id, cantidad})),
-                    notas: notas
-                })
-            });
+            // Se encola antes de enviar: si la red cae a mitad, el reenvío
+            // usa la misma clave y el servidor no lo duplica
+            const pedido = {
+                clave: this.nuevaClave(),
+                mesa: this.mesaId,
+                items: this.carrito.map(({id, cantidad}) => ({producto_id: id, cantidad})),
+                notas: notas
+            };
+            this.guardarCola([...this.leerCola(), pedido]);
             
-            const data = await response.json();
+            const resultado = await this.enviarDeCola(pedido);
+            if (resultado.estado !== 'pendiente') this.quitarDeCola(pedido.clave);
             
-            if (data.success) {
-                this.mostrarToast('🎉 ¡Pedido enviado correctamente!');
-                this.carrito = [];
-                this.actualizarCarritoUI();
-                this.cerrarCarrito();
-            } else {
-                throw new Error(data.mensaje || 'Error al enviar');
+            if (resultado.estado === 'rechazado') {
+                throw new Error(resultado.mensaje);
             }
+            
+            this.mostrarToast(resultado.estado === 'enviado'
+                ? '🎉 ¡Pedido enviado correctamente!'
+                : '📶 Sin conexión: tu pedido se enviará al recuperar la señal');
+            this.carrito = [];
+            this.actualizarCarritoUI();
+            this.cerrarCarrito();
         } catch (error) {
             this.mostrarToast('❌ ' + error.message, true);
         } finally {
@@ -622,6 +788,76 @@ class CartaApp {
         }
     }
 
+    // ==========================================
+    // COLA DE PEDIDOS SIN CONEXIÓN
+    // ==========================================
+
+    nuevaClave() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+    }
+
+    leerCola() {
+        try {
+            return JSON.parse(localStorage.getItem(CLAVE_COLA)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    guardarCola(cola) {
+        try {
+            localStorage.setItem(CLAVE_COLA, JSON.stringify(cola));
+        } catch (error) {
+            console.warn('No se pudo guardar la cola de pedidos:', error);
+        }
+    }
+
+    quitarDeCola(clave) {
+        this.guardarCola(this.leerCola().filter(p => p.clave !== clave));
+    }
+
+    // Retorna {estado: 'enviado' | 'rechazado' | 'pendiente'}; 'pendiente' = reintentar más tarde
+    async enviarDeCola({clave, mesa, items, notas}) {
+        let response;
+        try {
+            response = await fetch(`/api/pedido/${mesa}`, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({items, notas, clave})
+            });
+        } catch (error) {
+            return {estado: 'pendiente'};
+        }
+        
+        if (response.status >= 500) return {estado: 'pendiente'};
+        
+        const data = await response.json().catch(() => ({}));
+        if (response.ok && data.success) return {estado: 'enviado', data};
+        return {estado: 'rechazado', mensaje: data.detail || data.mensaje || 'Error al enviar'};
+    }
+
+    async reenviarCola() {
+        if (this.reenviando || !navigator.onLine) return;
+        this.reenviando = true;
+        
+        try {
+            for (const pedido of this.leerCola()) {
+                const resultado = await this.enviarDeCola(pedido);
+                if (resultado.estado === 'pendiente') break;
+                
+                this.quitarDeCola(pedido.clave);
+                if (resultado.estado === 'enviado') {
+                    this.mostrarToast('🎉 Pedido guardado sin conexión enviado');
+                } else {
+                    this.mostrarToast('❌ Un pedido guardado no se pudo enviar: ' + resultado.mensaje, true);
+                }
+            }
+        } finally {
+            this.reenviando = false;
+        }
+    }
+
     mostrarDialogoNotas() {
         return new Promise((resolve) => {
             this.resolveNotas = resolve;
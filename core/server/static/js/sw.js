@@ -0,0 +1,107 @@
+/**
+ * BOM_APETITE - SERVICE WORKER DE LA CARTA
+ * Precachea el shell y el menú listados en /api/offline/manifest y los sirve
+ * desde caché, así la carta abre aunque el móvil pierda el Wi-Fi un momento.
+ * Los pedidos sin conexión los encola carta.js (no pasan por aquí).
+ */
+
+const MANIFIESTO = '/api/offline/manifest';
+const PREFIJO_SHELL = 'carta-shell-';
+const CACHE_MENU = 'carta-menu';
+const CACHE_IMAGENES = 'carta-imagenes';
+const MAX_IMAGENES = 300;
+
+let runtime = ['/images/', '/miniaturas/', '/assets/'];
+let menuUrl = '/api/menu?formato=compacto';
+
+// ==========================================
+// PRECACHE
+// ==========================================
+
+async function precachear() {
+    const response = await fetch(MANIFIESTO, {cache: 'no-store'});
+    if (!response.ok) throw new Error('Manifiesto no disponible');
+    const manifiesto = await response.json();
+    runtime = manifiesto.runtime;
+    menuUrl = manifiesto.menu;
+
+    const nombre = PREFIJO_SHELL + manifiesto.version;
+    if (!(await caches.has(nombre))) {
+        const cache = await caches.open(nombre);
+        await cache.addAll(manifiesto.shell);
+    }
+    if (!(await caches.match(menuUrl))) {
+        await (await caches.open(CACHE_MENU)).add(menuUrl);
+    }
+
+    // El shell anterior se descarta solo cuando el nuevo está completo
+    const anteriores = (await caches.keys()).filter(c => c.startsWith(PREFIJO_SHELL) && c !== nombre);
+    await Promise.all(anteriores.map(c => caches.delete(c)));
+}
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(precachear().then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(self.clients.claim());
+});
+
+// ==========================================
+// ESTRATEGIAS
+// ==========================================
+
+async function cacheFirst(request, opciones) {
+    const guardada = await caches.match(request, opciones);
+    return guardada || fetch(request);
+}
+
+// Responde con la copia guardada y la renueva en segundo plano
+async function staleWhileRevalidate(event) {
+    const cache = await caches.open(CACHE_MENU);
+    const guardada = await cache.match(event.request);
+    const red = fetch(event.request).then(response => {
+        if (response.ok) return cache.put(event.request, response.clone()).then(() => response);
+        return response;
+    });
+    if (guardada) {
+        event.waitUntil(red.catch(() => {}));
+        return guardada;
+    }
+    return red;
+}
+
+async function imagen(request) {
+    const cache = await caches.open(CACHE_IMAGENES);
+    const guardada = await cache.match(request);
+    if (guardada) return guardada;
+
+    const response = await fetch(request);
+    if (response.ok) {
+        await cache.put(request, response.clone());
+        const claves = await cache.keys();
+        // Las claves salen en orden de inserción: se borran las más antiguas
+        await Promise.all(claves.slice(0, Math.max(0, claves.length - MAX_IMAGENES)).map(c => cache.delete(c)));
+    }
+    return response;
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.mode === 'navigate' && url.pathname === '/') {
+        // La misma carta sirve a todas las mesas (?mesa=N)
+        event.respondWith(cacheFirst(request, {ignoreSearch: true}));
+        event.waitUntil(precachear().catch(() => {}));
+    } else if (url.pathname + url.search === menuUrl) {
+        event.respondWith(staleWhileRevalidate(event));
+    } else if (url.pathname.startsWith('/static/')) {
+        event.respondWith(cacheFirst(request));
+    } else if (runtime.some(prefijo => url.pathname.startsWith(prefijo))) {
+        event.respondWith(imagen(request));
+    }
+});